@@ -0,0 +1,231 @@
+# benchmarks/cron_jobs.py
+"""Coût des crons nocturnes selon la taille de la base (10k, 100k, 1M users).
+
+Pour chaque taille, une base jetable est remplie une fois (mélange réaliste de
+quit_date, paid_until, notifications_enabled, last_checkpoint, utc_offset),
+puis chaque job tourne dans son propre process sur une copie fraîche : RSS max
+et compteurs ne se mélangent pas d'un job à l'autre. Les jobs horaires (un run
+par fuseau) sont rejoués sur les 24 passages d'une journée.
+
+    python benchmarks/cron_jobs.py
+    python benchmarks/cron_jobs.py --sizes 10000,100000 --jobs checkpoints,expire
+    python benchmarks/cron_jobs.py --rate 25        # avec le vrai débit d'envoi
+
+Par job : lignes traitées, durée, RSS max, requêtes SQL, appels Bot API (total
+de la journée et pic sur un passage). Par défaut le bucket d'envoi est débridé
+(on mesure le coût DB/CPU) ; la colonne « à N msg/s » donne la durée minimale
+du passage le plus chargé imposée par BROADCAST_RATE.
+"""
+from __future__ import annotations
+
+import argparse, asyncio, json, logging, random, resource, shutil, subprocess, sys, tempfile, time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from harness import FakeSession, prepare
+
+JOBS = ("checkpoints", "motivation", "expire")
+# communauté surtout russophone : Moscou en tête, puis Europe, Oural, Sibérie, Asie centrale
+UTC_OFFSET_WEIGHTS = {3: 55, 2: 10, 1: 8, 4: 5, 5: 6, 6: 3, 7: 3, 0: 3, 8: 1, 10: 1, -5: 1}
+SEED_CHUNK = 10_000
+FIRST_USER = 10_000_000
+
+
+# ───────────────────────────────  Seed (process enfant)  ──────────────────
+def _user_rows(n: int, rng: random.Random, expired_share: float, milestones: list[int]):
+    """Users façon production : récents surreprésentés, paliers fêtés jusqu'à hier."""
+    today = date.today()
+    now = datetime.utcnow()
+    offsets, weights = list(UTC_OFFSET_WEIGHTS), list(UTC_OFFSET_WEIGHTS.values())
+    for i in range(n):
+        quit_date, last_checkpoint = None, 0
+        if rng.random() < 0.85:                                   # profil avec date d'arrêt
+            days = min(int(rng.expovariate(1 / 200)), 2_000)
+            quit_date = today - timedelta(days=days)
+            # paliers déjà fêtés : ceux atteints avant aujourd'hui (les autres sont dus)
+            done = [m for m in milestones if m < days]
+            if done and rng.random() < 0.01:                      # 1 % de retard (cron raté)
+                done.pop()
+            last_checkpoint = done[-1] if done else 0
+
+        r = rng.random()
+        if r < 0.70:                                              # membre payé / essai en cours
+            is_member, paid_until = True, now + timedelta(days=rng.uniform(0, 365))
+        elif r < 0.70 + expired_share:                           # expiré au-delà de la grâce
+            is_member, paid_until = True, now - timedelta(days=rng.uniform(3, 40))
+        elif r < 0.90:                                            # ancien membre
+            is_member, paid_until = False, now - timedelta(days=rng.uniform(3, 400))
+        else:                                                     # jamais payé
+            is_member, paid_until = False, None
+
+        yield {
+            "telegram_id": FIRST_USER + i,
+            "pseudo": f"u{i}", "avatar_emoji": "👤",
+            "quit_date": quit_date,
+            "last_checkpoint": last_checkpoint,
+            "is_sober": rng.random() < 0.9,
+            "notifications_enabled": rng.random() < 0.8,
+            "is_member": is_member,
+            "paid_until": paid_until,
+            "utc_offset": rng.choices(offsets, weights)[0],
+        }
+
+
+async def seed(n: int, expired_share: float) -> None:
+    from sqlalchemy import insert
+
+    from config import MILESTONES
+    from database.database import Base, engine
+    from database.migrations import upgrade
+    from database.user import User, next_milestone_date
+
+    rng = random.Random(n)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        chunk = []
+        for row in _user_rows(n, rng, expired_share, MILESTONES):
+            row["next_milestone_at"] = next_milestone_date(row["quit_date"], row["last_checkpoint"])
+            chunk.append(row)
+            if len(chunk) == SEED_CHUNK:
+                await conn.execute(insert(User), chunk)
+                chunk = []
+        if chunk:
+            await conn.execute(insert(User), chunk)
+        await upgrade(conn)       # base neuve : amorce les compteurs (anon, free90, stats)
+    await engine.dispose()
+
+
+# ───────────────────────────────  Job (process enfant)  ───────────────────
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024    # Linux : Ko
+
+
+async def run_job(job: str, rate: float) -> dict:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    import bot as app
+    from database.database import engine
+    from services.broadcast import GLOBAL_BUCKET
+
+    statements = 0
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _count(*_):
+        nonlocal statements
+        statements += 1
+
+    session = FakeSession()
+    app.bot.session = session
+    if rate:
+        GLOBAL_BUCKET.rate, GLOBAL_BUCKET.capacity = rate, max(1, int(rate))
+    else:
+        GLOBAL_BUCKET.rate = GLOBAL_BUCKET.capacity = 1e9     # débridé : coût DB/CPU seul
+
+    # passages d'une journée UTC : 24 pour un job horaire, 1 pour un job à scope unique
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    scopes = []
+    for hour in range(24):
+        scopes += [s for s in app.jobs.jobs[job].scopes(day + timedelta(hours=hour)) if s not in scopes]
+
+    rss_before = _peak_rss_mb()
+    rows = failed = peak_calls = 0
+    t0 = time.perf_counter()
+    for scope in scopes:
+        calls = session.total_calls
+        stats = await app.jobs.run(job, scope)
+        rows, failed = rows + stats.total, failed + stats.failed
+        peak_calls = max(peak_calls, session.total_calls - calls)
+    wall = time.perf_counter() - t0
+    await engine.dispose()
+    return {
+        "job": job, "runs": len(scopes), "rows": rows, "failed": failed, "seconds": wall,
+        "rss_mb": _peak_rss_mb(), "rss_before_mb": rss_before,
+        "sql": statements, "api_calls": session.total_calls, "peak_api_calls": peak_calls,
+        "api_by_method": dict(session.calls),
+    }
+
+
+# ───────────────────────────────  Orchestration  ──────────────────────────
+def _child(*args: str) -> str:
+    proc = subprocess.run([sys.executable, __file__, *args], capture_output=True, text=True)
+    if proc.returncode:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"échec du process enfant : {' '.join(args)}")
+    return proc.stdout
+
+
+def _fmt_duration(seconds: float) -> str:
+    if seconds < 120:
+        return f"{seconds:.1f} s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def print_table(results: list[dict], rate: float) -> None:
+    print(f"{'users':>9} {'job':<12} {'runs':>4} {'lignes':>8} {'durée':>9} {'RSS max':>9} {'SQL':>7} "
+          f"{'API':>8} {'pic API':>8} {f'à {rate:g} msg/s':>12}")
+    for r in results:
+        print(f"{r['users']:>9} {r['job']:<12} {r['runs']:>4} {r['rows']:>8} {_fmt_duration(r['seconds']):>9} "
+              f"{r['rss_mb']:>7.0f}Mo {r['sql']:>7} {r['api_calls']:>8} {r['peak_api_calls']:>8} "
+              f"{_fmt_duration(r['peak_api_calls'] / rate):>12}")
+
+
+def main(args: argparse.Namespace) -> list[dict]:
+    from config import BROADCAST_RATE
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-cron-") as tmp:
+        for size in args.sizes:
+            seeded = Path(tmp) / f"users-{size}.db"
+            t0 = time.perf_counter()
+            _child("--seed", str(size), "--db", str(seeded), "--expired-share", str(args.expired_share))
+            print(f"· {size} users seedés en {_fmt_duration(time.perf_counter() - t0)}", file=sys.stderr)
+            for job in args.jobs:
+                db = Path(tmp) / f"run-{size}-{job}.db"
+                shutil.copyfile(seeded, db)       # chaque job part de la même base
+                out = json.loads(_child("--run", job, "--db", str(db), "--rate", str(args.rate))
+                                 .strip().splitlines()[-1])
+                results.append({"users": size, **out})
+                db.unlink()
+            seeded.unlink()
+    print_table(results, args.rate or BROADCAST_RATE)
+    return results
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")],
+                   default=[10_000, 100_000, 1_000_000], help="nombres d'users, séparés par des virgules")
+    p.add_argument("--jobs", type=lambda s: s.split(","), default=list(JOBS),
+                   help=f"jobs séparés par des virgules ({','.join(JOBS)})")
+    p.add_argument("--rate", type=float, default=0.0,
+                   help="débit d'envoi imposé (msg/s) ; 0 = débridé")
+    p.add_argument("--expired-share", type=float, default=0.03,
+                   help="part des users membres expirés au-delà de la grâce")
+    p.add_argument("--json", type=Path, help="écrit aussi les résultats dans ce fichier")
+    # usage interne : un process par seed / par job
+    p.add_argument("--seed", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--run", choices=JOBS, help=argparse.SUPPRESS)
+    p.add_argument("--db", type=Path, help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+    unknown = set(args.jobs) - set(JOBS)
+    if unknown:
+        p.error(f"job inconnu : {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    prepare(args.db)
+    logging.disable(logging.WARNING)      # progression du Broadcaster, résumé des crons : bruit
+    if args.seed is not None:
+        asyncio.run(seed(args.seed, args.expired_share))
+    elif args.run:
+        print(json.dumps(asyncio.run(run_job(args.run, args.rate))))
+    else:
+        results = main(args)
+        if args.json:
+            args.json.write_text(json.dumps({"args": {k: str(v) for k, v in vars(args).items()},
+                                             "results": results}, indent=2, ensure_ascii=False))
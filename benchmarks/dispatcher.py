@@ -0,0 +1,313 @@
+# benchmarks/dispatcher.py
+"""Débit de bout en bout du Dispatcher : le vrai `dp` de bot.py, tous les routers.
+
+Des `Update` synthétiques passent par `dp.feed_update` avec un Bot dont la
+session ne fait aucun appel réseau (réponses fabriquées, latence simulée
+optionnelle), sur une base SQLite temporaire remplie d'users et de posts.
+
+    python benchmarks/dispatcher.py
+    python benchmarks/dispatcher.py --users 20000 --updates 5000 --concurrency 100
+    DB_PROFILE=wal python benchmarks/dispatcher.py --only like,reply --api-latency 40
+    DB_PROFILE=wal python benchmarks/dispatcher.py --workers 4     # mode multi-process
+
+Par scénario : updates/s, p50/p95/p99 par update, requêtes SQL et appels Bot API
+par update. `--json FICHIER` garde le résultat pour comparer avant/après.
+Avec `--workers N`, les updates passent par le WorkerPool de services/workers.py
+vers N process : seul le débit est mesuré (la latence est vécue dans les workers).
+"""
+from __future__ import annotations
+
+import argparse, asyncio, functools, itertools, json, logging, multiprocessing as mp, random, time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from harness import FakeSession, prepare
+
+prepare()        # base temporaire, avant d'importer bot.py
+
+from aiogram import Bot                                                    # noqa: E402
+from aiogram.client.default import DefaultBotProperties                    # noqa: E402
+from aiogram.enums.parse_mode import ParseMode                             # noqa: E402
+from aiogram.types import Update                                           # noqa: E402
+from sqlalchemy import insert                                              # noqa: E402
+
+import bot as app                                                          # noqa: E402
+from config import SUPER_GROUP, TOPICS                                     # noqa: E402
+from database.database import Base, engine                                 # noqa: E402
+from database.migrations import upgrade                                    # noqa: E402
+from database.post import Post                                             # noqa: E402
+from database.user import User, next_milestone_date                        # noqa: E402
+from services.bot_metrics import HANDLER_SQL                               # noqa: E402
+from services.edit_coalescer import markup_coalescer                       # noqa: E402
+from services.workers import WorkerPool, run_worker                        # noqa: E402
+
+SCENARIOS = ("sos", "like", "reply", "counter", "settings")
+FIRST_USER = 10_000_000          # telegram_id du premier user seedé
+FIRST_POST = 1_000               # message_id du premier post seedé
+
+
+# ───────────────────────────────  Données  ────────────────────────────────
+async def seed(users: int, posts: int) -> None:
+    """Schéma + users membres au profil complet + posts SOS, puis migrations (compteurs)."""
+    today = date.today()
+    paid_until = datetime.utcnow() + timedelta(days=365)
+    rng = random.Random(42)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        rows = []
+        for i in range(users):
+            quit_date = today - timedelta(days=rng.randint(0, 900))
+            rows.append({
+                "telegram_id": FIRST_USER + i, "pseudo": f"u{i}", "avatar_emoji": "👤",
+                "quit_date": quit_date, "is_member": True, "paid_until": paid_until,
+                "next_milestone_at": next_milestone_date(quit_date, 0),
+            })
+            if len(rows) == 5_000:
+                await conn.execute(insert(User), rows)
+                rows = []
+        if rows:
+            await conn.execute(insert(User), rows)
+        await conn.execute(insert(Post), [
+            {"id": FIRST_POST + i, "author_id": rng.randint(1, users),
+             "thread_id": TOPICS["sos"], "text": f"post {i}"}
+            for i in range(posts)
+        ])
+        await upgrade(conn)   # sur une base neuve : amorce aussi les compteurs (anon, free90, stats)
+
+
+# ───────────────────────────────  Updates  ────────────────────────────────
+class Factory:
+    def __init__(self, bot: Bot, users: int, posts: int):
+        self.bot = bot
+        self.users = users
+        self.posts = posts
+        self.ids = itertools.count(1)
+        self.rng = random.Random(7)
+
+    def user(self) -> dict:
+        uid = FIRST_USER + self.rng.randrange(self.users)
+        return {"id": uid, "is_bot": False, "first_name": f"u{uid}"}
+
+    def post_id(self) -> int:
+        return FIRST_POST + self.rng.randrange(self.posts)
+
+    def _update(self, n: int, **payload) -> Update:
+        # comme le polling : JSON → Update validé avec le bot dans le contexte
+        return Update.model_validate({"update_id": n, **payload}, context={"bot": self.bot})
+
+    def dm(self, user: dict, text: str) -> Update:
+        n = next(self.ids)
+        return self._update(n, message={
+            "message_id": n, "date": int(time.time()), "text": text,
+            "from": user, "chat": {"id": user["id"], "type": "private"},
+        })
+
+    def tap(self, user: dict, data: str, post_id: int) -> Update:
+        n = next(self.ids)
+        return self._update(n, callback_query={
+            "id": str(n), "from": user, "chat_instance": "bench", "data": data,
+            "message": {"message_id": post_id, "date": int(time.time()),
+                        "message_thread_id": TOPICS["sos"],
+                        "chat": {"id": SUPER_GROUP, "type": "supergroup"}},
+        })
+
+    def flow(self, scenario: str) -> list[Update]:
+        """Updates d'une interaction, à rejouer dans l'ordre (même user)."""
+        user = self.user()
+        if scenario == "sos":
+            return [self.dm(user, "/sos"), self.dm(user, "Тяжёлый вечер, держусь.")]
+        if scenario == "like":
+            return [self.tap(user, f"like:{self.post_id()}", self.post_id())]
+        if scenario == "reply":
+            post_id = self.post_id()
+            return [self.tap(user, f"reply:{post_id}", post_id), self.dm(user, "Держись, ты не один!")]
+        if scenario == "counter":
+            return [self.dm(user, "/counter")]
+        if scenario == "settings":
+            return [self.dm(user, "/settings")]
+        raise ValueError(scenario)
+
+
+# ───────────────────────────────  Mesure  ─────────────────────────────────
+def _sql_total() -> float:
+    return sum(child.value for _, child in HANDLER_SQL.items())
+
+
+def _quantile(ordered: list[float], q: float) -> float:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+async def run_scenario(bot: Bot, factory: Factory, scenario: str, updates: int, concurrency: int) -> dict:
+    flows: list[list[Update]] = []
+    planned = 0
+    while planned < updates:
+        flow = factory.flow(scenario)
+        flows.append(flow)
+        planned += len(flow)
+    queue = iter(flows)
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for flow in queue:            # itérateur partagé : chaque worker prend l'interaction suivante
+            for update in flow:
+                t0 = time.perf_counter()
+                try:
+                    await app.dp.feed_update(bot, update)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+    session: FakeSession = bot.session
+    calls0, sql0 = session.total_calls, _sql_total()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    n = len(ordered)
+    return {
+        "scenario": scenario, "updates": n, "errors": errors, "seconds": wall,
+        "updates_per_s": n / wall if wall else 0.0,
+        "p50_ms": _quantile(ordered, 0.50) * 1000,
+        "p95_ms": _quantile(ordered, 0.95) * 1000,
+        "p99_ms": _quantile(ordered, 0.99) * 1000,
+        "sql_per_update": (_sql_total() - sql0) / n if n else 0.0,
+        "api_per_update": (session.total_calls - calls0) / n if n else 0.0,
+    }
+
+
+# ───────────────────────────────  Mode --workers  ──────────────────────────
+def _bench_bot(api_latency: float, worker: int | None = None) -> Bot:
+    # chaque worker envoie ses « messages » dans sa propre plage d'ids (l'ingress garde la première)
+    first_id = 50_000_000 if worker is None else 50_000_000 + (worker + 1) * 10_000_000
+    return Bot(app.TOKEN, session=FakeSession(api_latency, first_id),
+               default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+
+def _worker(done, errors, api_latency: float, index: int, queue, reports) -> None:
+    """Process worker : ce script y est ré-importé (même base via BENCH_DB), Bot API simulée.
+
+    `done` / `errors` : compteurs partagés (mp.Value) des updates traités / en échec.
+    """
+    logging.disable(logging.CRITICAL)      # les échecs sont comptés, pas loggés
+    feed = app.dp.feed_update
+
+    async def counted(bot, update, **kwargs):
+        try:
+            return await feed(bot, update, **kwargs)
+        except Exception:
+            with errors.get_lock():
+                errors.value += 1
+            raise
+        finally:
+            with done.get_lock():
+                done.value += 1
+
+    app.dp.feed_update = counted
+    run_worker(app.dp, _bench_bot(api_latency, index), index, queue, reports)
+
+
+async def run_scenario_workers(pool: WorkerPool, done, errors, factory: Factory, scenario: str,
+                               updates: int) -> dict:
+    flows = []
+    planned = 0
+    while planned < updates:
+        flow = factory.flow(scenario)
+        flows.append(flow)
+        planned += len(flow)
+    target = done.value + planned
+    errors0 = errors.value
+    started = time.perf_counter()
+    for flow in flows:
+        for update in flow:
+            await pool.dispatch(update)
+    while done.value < target:
+        await asyncio.sleep(0.005)
+    wall = time.perf_counter() - started
+    return {
+        "scenario": scenario, "updates": planned, "errors": errors.value - errors0, "seconds": wall,
+        "updates_per_s": planned / wall if wall else 0.0,
+        "p50_ms": None, "p95_ms": None, "p99_ms": None,
+        "sql_per_update": None, "api_per_update": None,
+    }
+
+
+# ───────────────────────────────  Rapport  ────────────────────────────────
+def _cell(value, width: int, fmt: str) -> str:
+    return f"{'—':>{width}}" if value is None else f"{value:>{width}{fmt}}"
+
+
+def print_table(results: list[dict]) -> None:
+    print(f"{'scénario':<10} {'updates':>8} {'upd/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'SQL/upd':>8} {'API/upd':>8} {'erreurs':>8}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['updates']:>8} {r['updates_per_s']:>9.0f} "
+              f"{_cell(r['p50_ms'], 8, '.1f')} {_cell(r['p95_ms'], 8, '.1f')} {_cell(r['p99_ms'], 8, '.1f')} "
+              f"{_cell(r['sql_per_update'], 8, '.1f')} {_cell(r['api_per_update'], 8, '.1f')} "
+              f"{_cell(r['errors'], 8, '')}")
+
+
+async def main(args: argparse.Namespace) -> list[dict]:
+    await seed(args.users, args.posts)
+    bot = _bench_bot(args.api_latency / 1000)
+    factory = Factory(bot, args.users, args.posts)
+
+    if args.workers:
+        ctx = mp.get_context("spawn")
+        done, errors = ctx.Value("q", 0), ctx.Value("q", 0)
+        pool = WorkerPool(functools.partial(_worker, done, errors, args.api_latency / 1000), args.workers)
+        pool.start()
+        for scenario in args.only:      # échauffement : démarrage des process compris
+            await run_scenario_workers(pool, done, errors, factory, scenario, min(args.warmup, args.updates))
+        results = [
+            await run_scenario_workers(pool, done, errors, factory, scenario, args.updates)
+            for scenario in args.only
+        ]
+        await pool.stop()
+        await engine.dispose()
+        return results
+
+    for scenario in args.only:          # échauffement : caches, pool, getMe du filtre Command
+        await run_scenario(bot, factory, scenario, min(args.warmup, args.updates), args.concurrency)
+    results = [
+        await run_scenario(bot, factory, scenario, args.updates, args.concurrency)
+        for scenario in args.only
+    ]
+
+    # éditions ❤️ encore en attente dans le coalescer : on les laisse partir avant de fermer
+    await asyncio.sleep(markup_coalescer.window if markup_coalescer.stats()["pending"] else 0)
+    await app.dp.storage.close()
+    await engine.dispose()
+    return results
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--users", type=int, default=5_000, help="users seedés (membres actifs)")
+    p.add_argument("--posts", type=int, default=2_000, help="posts SOS seedés")
+    p.add_argument("--updates", type=int, default=2_000, help="updates mesurés par scénario")
+    p.add_argument("--warmup", type=int, default=200, help="updates d'échauffement par scénario")
+    p.add_argument("--concurrency", type=int, default=50, help="updates traités en parallèle")
+    p.add_argument("--workers", type=int, default=0,
+                   help="process workers derrière un ingress (services/workers.py) ; 0 = in-process")
+    p.add_argument("--api-latency", type=float, default=0.0, help="latence Bot API simulée (ms)")
+    p.add_argument("--only", type=lambda s: s.split(","), default=list(SCENARIOS),
+                   help=f"scénarios séparés par des virgules ({','.join(SCENARIOS)})")
+    p.add_argument("--json", type=Path, help="écrit aussi les résultats dans ce fichier")
+    args = p.parse_args(argv)
+    unknown = set(args.only) - set(SCENARIOS)
+    if unknown:
+        p.error(f"scénario inconnu : {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.disable(logging.WARNING)       # les handlers loggent chaque callback : bruit
+    results = asyncio.run(main(args))
+    print_table(results)
+    if args.json:
+        args.json.write_text(json.dumps({"args": {k: str(v) for k, v in vars(args).items()},
+                                         "results": results}, indent=2, ensure_ascii=False))
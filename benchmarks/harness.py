@@ -0,0 +1,85 @@
+# benchmarks/harness.py
+"""Outils communs aux benchmarks : environnement du projet et Bot API simulée.
+
+`prepare()` doit être appelé AVANT le premier import du projet : config.py lit
+config.yml dans le répertoire courant et DB_PATH / TELEGRAM_TOKEN à l'import.
+"""
+from __future__ import annotations
+
+import asyncio, itertools, os, sys, tempfile
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, TelegramMethod
+from aiogram.types import Chat, Message, User
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_TOKEN = "123456:BENCHMARKBENCHMARKBENCHMARKBENCHMA"
+
+_tmpdirs: list[tempfile.TemporaryDirectory] = []     # supprimés à la sortie du process
+
+
+def prepare(db_file: str | Path | None = None) -> Path:
+    """Base SQLite jetable (ou `db_file`), racine du projet en cwd et dans sys.path.
+
+    Les process enfants (spawn) héritent de BENCH_DB et retrouvent la même base.
+    """
+    if db_file is None and os.environ.get("BENCH_DB"):
+        db_file = os.environ["BENCH_DB"]
+    if db_file is None:
+        tmp = tempfile.TemporaryDirectory(prefix="bench-")
+        _tmpdirs.append(tmp)
+        db_file = Path(tmp.name) / "bench.db"
+    db_file = Path(db_file).resolve()
+    os.environ["BENCH_DB"] = str(db_file)
+    os.chdir(ROOT)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    os.environ["DB_PATH"] = f"sqlite+aiosqlite:///{db_file}"
+    os.environ.setdefault("TELEGRAM_TOKEN", FAKE_TOKEN)
+    os.environ.setdefault("FSM_STORAGE", "sqlite")
+    return db_file
+
+
+class FakeSession(BaseSession):
+    """Répond à chaque méthode sans réseau ; `latency` simule l'aller-retour Telegram.
+
+    `calls` compte les appels par méthode Bot API (`sum(calls.values())` = total).
+    `first_message_id` : plages disjointes par process (posts.id = message_id, unique).
+    """
+
+    def __init__(self, latency: float = 0.0, first_message_id: int = 50_000_000):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(first_message_id)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="bench", username="bench_bot")
+        if method.__returning__ is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._message_ids), date=datetime.now(),
+                chat=Chat(id=chat_id, type="private" if isinstance(chat_id, int) and chat_id > 0
+                          else "supergroup"),
+                message_thread_id=getattr(method, "message_thread_id", None),
+                text=getattr(method, "text", None),
+            ).as_(bot)
+        return True          # bool, Message | bool (éditions), reste : sans importance ici
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
@@ -2,24 +2,36 @@
 from __future__ import annotations
 
 import asyncio, logging, random
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums.parse_mode import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand, BotCommandScopeDefault
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
-import aiocron
-from sqlalchemy import select
 
 from config import (
     TOKEN, MILESTONES, SUPER_GROUP, TOPICS,
-    GRACE_DAYS, TRIBUTE_URL_TEMPLATE, ADMINS
+    GRACE_DAYS, TRIBUTE_URL_TEMPLATE, ADMINS,
+    TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_SECRET,
+    FSM_STORAGE, WORKERS, MOTIVATION_HOUR, CHECKPOINT_HOUR,
 )
-from database.database import async_session
-from database.user import User
-from database.utils import get_user, create_user_stub, update_user
+from database.fsm_storage import build_storage
+from database.user import User, next_milestone_date
+from database.utils import (
+    iter_user_chunks, iter_users_by_id, bulk_update_users,
+    due_milestone_user_ids, expire_members_batch, pending_kicks, record_kicks, kick_backlog,
+)
+from services.bot_metrics import instrument, metrics_handler, track_job
+from services.jobs import (
+    JobLocked, JobRunHandle, JobScheduler, LocalSlot, job_history, local_day_slots, local_hour_slots,
+)
+from services.broadcast import Broadcaster
+from services.telegram_session import InstrumentedSession, telegram_stats
+from services.tracing import latency_summary
+from services.tribute import TributeWorker
+from services.workers import WorkerPool, run_worker
 
 from aiogram import F
 
@@ -34,13 +46,17 @@ from handlers.main import post_inline_keyboard   # pour le clavier sous les post
 # ───────────────────────────  Bot / Dispatcher
 logging.basicConfig(level=logging.INFO)
 
-bot = Bot(TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp  = Dispatcher(storage=MemoryStorage())
-for r in (
-    onboarding_router, main_router, replies_router,
-    counter_router, posts_router, settings_router, pay_router, help_router, debug_router,
-):
+bot = Bot(TOKEN, session=InstrumentedSession(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+dp  = Dispatcher(storage=build_storage())   # FSM persistant (SQLite par défaut)
+dp.shutdown.register(dp.storage.close)      # flush des écritures FSM en attente (polling et webhook)
+ROUTERS = {
+    "onboarding_router": onboarding_router, "main_router": main_router, "replies_router": replies_router,
+    "counter_router": counter_router, "posts_router": posts_router, "settings_router": settings_router,
+    "pay_router": pay_router, "help_router": help_router, "debug_router": debug_router,
+}
+for r in ROUTERS.values():
     dp.include_router(r)
+instrument(dp, ROUTERS)   # métriques /metrics (updates, handlers par router)
 
 # ───────────────────────────  /commands
 DEFAULT_COMMANDS = [
@@ -61,295 +77,326 @@ QUOTES = [
     "Продолжай, ты на правильном пути! 🌟",
 ]
 
-# ───────────────────────────  Cron : checkpoints sobriété (wins auto)
-@aiocron.crontab("30 0 * * *")
-async def sobriety_check():
-    async with async_session() as ses:
-        users = (await ses.execute(select(User))).scalars().all()
-
-        for u in users:
-            if not u.quit_date:
-                continue
-
-            days     = (date.today() - u.quit_date).days
-            next_ms  = next((m for m in MILESTONES if m > u.last_checkpoint), None)
-
-            if next_ms and days >= next_ms:
-                # DM perso
-                try:
-                    await bot.send_message(
-                        u.telegram_id,
-                        f"🎉 Поздравляю! Сегодня {next_ms} дней трезвости."
-                    )
-                except Exception as e:
-                    logging.warning("DM checkpoint failed %s: %s", u.telegram_id, e)
-
-                # Post automatique dans WINS
-                try:
-                    sent = await bot.send_message(
-                        SUPER_GROUP,
-                        message_thread_id=TOPICS["wins"],
-                        text=f"🥳 {u.avatar_emoji} <b>{u.pseudo}</b> празднует <b>{next_ms} дней трезвости.</b>",
-                    )
-                    await bot.edit_message_reply_markup(
-                        SUPER_GROUP, sent.message_id,
-                        reply_markup=post_inline_keyboard(
-                            message_id=sent.message_id,
-                            with_reply=True, with_like=True, with_support=False, likes=0
-                        )
-                    )
-                except Exception as e:
-                    logging.warning("Posting checkpoint failed for %s: %s", u.telegram_id, e)
-
-                u.last_checkpoint = next_ms
-
-        await ses.commit()
-
-# ───────────────────────────  Cron : citations quotidiennes (9:00 UTC)
-@aiocron.crontab("0 9 * * *")
-async def motivation_notifs():
-    async with async_session() as ses:
-        users = (await ses.execute(
-            select(User).where(User.notifications_enabled == True)
-        )).scalars().all()
-
-        for u in users:
-            try:
-                await bot.send_message(u.telegram_id, random.choice(QUOTES))
-            except Exception as e:
-                logging.debug("Motivation DM fail %s: %s", u.telegram_id, e)
-
-# ───────────────────────────  Cron : expiration abonnements / essais (01:05 UTC)
-@aiocron.crontab("5 1 * * *")
-async def expire_memberships():
-    now = datetime.utcnow()
-    cutoff = now - timedelta(days=GRACE_DAYS)
-
-    async with async_session() as ses:
-        expired = (await ses.execute(
-            select(User).where(
-                User.is_member == True,
-                User.paid_until.is_not(None),
-                User.paid_until < cutoff
-            )
-        )).scalars().all()
-
-        for u in expired:
-            u.is_member = False
-            # On enlève du groupe (ban+unban pour autoriser un retour via lien)
-            try:
-                await bot.ban_chat_member(SUPER_GROUP, u.telegram_id)
-                await bot.unban_chat_member(SUPER_GROUP, u.telegram_id)
-            except Exception as e:
-                logging.warning("Remove from group failed %s: %s", u.telegram_id, e)
-
-            # DM de renouvellement
-            try:
-                await bot.send_message(
-                    u.telegram_id,
-                    "⏳ Срок доступа истёк.\n"
-                    "Чтобы вернуться в закрытый клуб, продли подписку:\n"
-                    f"{TRIBUTE_URL_TEMPLATE}"
-                )
-            except Exception as e:
-                logging.debug("DM renewal fail %s: %s", u.telegram_id, e)
-
-        await ses.commit()
-
 # ───────────────────────────  Webhook Tribute
-async def handle_webhook(request: web.Request):
-    data = await request.json()
-    logging.warning("WEBHOOK DATA %s", data)
+tribute_worker = TributeWorker(bot)
 
-    event_name = (data.get("name") or "").strip()
 
-    # Tribute envoie "new_subscription" (snake_case). Par prudence on accepte aussi camelCase.
-    if event_name in {"new_subscription", "newSubscription"}:
-        payload = data.get("payload") or {}
+# =================================================================
+# 1) JOBS (planifiés par `jobs.start()` dans main(), lançables à la main)
+# =================================================================
+# Une seule déclaration par job : crontab UTC + run enregistré dans job_runs
+# (verrou, reprise au cursor après un crash, historique pour /cron_status).
+# Paliers et citations partent à l'heure locale : cron horaire, un run par fuseau
+# (users.utc_offset) où c'est l'heure → la charge du jour s'étale sur 24 passages.
+jobs = JobScheduler()
+
+
+@jobs.job("checkpoints", "30 * * * *", scopes=lambda now: local_hour_slots(CHECKPOINT_HOUR, now))
+@track_job("checkpoints")
+async def sobriety_check_job(run: JobRunHandle):
+    bc = Broadcaster("checkpoints")
+    slot = LocalSlot.parse(run.scope)
+
+    async def celebrate(item):
+        u, next_ms = item
+        # DM
         try:
-            uid = int(payload["telegram_user_id"])
-        except Exception:
-            logging.error("Webhook: telegram_user_id manquant ou invalide: %s", payload)
-            return web.Response(text="bad request", status=400)
-
-        # 1) paid_until = expires_at du webhook (ISO, termine par 'Z')
-        raw_expires = payload.get("expires_at")
-        until = None
-        if raw_expires:
-            try:
-                # "2025-04-20T01:15:57.305733Z" -> datetime UTC
-                until = datetime.fromisoformat(raw_expires.replace("Z", "+00:00"))
-            except Exception as e:
-                logging.warning("Parse expires_at échoué (%s): %s", raw_expires, e)
-
-        # Fallback si jamais expires_at absent ou invalide
-        if until is None:
-            until = datetime.utcnow() + timedelta(days=31)
-
-        # 2) Upsert user + statut membre
-        user = await get_user(uid)
-        if user:
-            await update_user(uid, is_member=True, paid_until=until)
-        else:
-            await create_user_stub(uid)
-            await update_user(uid, is_member=True, paid_until=until)
-
-        # 3) Lien d’invitation one-shot (utile si pas encore dans le groupe)
+            await bc.call(bot.send_message, u.telegram_id, f"🎉 Поздравляю! Сегодня {next_ms} дней трезвости.")
+        except Exception as e:
+            logging.warning("DM checkpoint failed %s: %s", u.telegram_id, e)
+        # Post auto dans WINS
         try:
-            invite = await bot.create_chat_invite_link(SUPER_GROUP, member_limit=1)
-            await bot.send_message(
-                uid,
-                f"🎉 Оплата принята!\n"
-                f"Доступ активен до <b>{until.strftime('%d.%m.%Y')}</b>.\n"
-                f"➡️ Вступай: {invite.invite_link}"
+            sent = await bc.call_in_chat(
+                SUPER_GROUP,
+                bot.send_message,
+                SUPER_GROUP,
+                message_thread_id=TOPICS["wins"],
+                text=f"🥳 {u.avatar_emoji} <b>{u.pseudo}</b> празднует <b>{next_ms} дней трезвости.</b>",
+            )
+            await bc.call(
+                bot.edit_message_reply_markup,
+                chat_id=SUPER_GROUP, message_id=sent.message_id,
+                reply_markup=post_inline_keyboard(
+                    message_id=sent.message_id,
+                    with_reply=True, with_like=True, with_support=False, likes=0
+                )
             )
         except Exception as e:
-            logging.warning("Invite link fail for %s: %s", uid, e)
+            logging.warning("Posting checkpoint failed for %s: %s", u.telegram_id, e)
+
+    # seuls les users du fuseau dont next_milestone_at est passé (date locale) sont lus (index) ;
+    # un palier manqué reste dû et part au passage du lendemain
+    ids = await due_milestone_user_ids(slot.day, after_id=run.cursor, utc_offset=slot.offset)
+    async for rows in iter_users_by_id(
+        ids, User.telegram_id, User.quit_date, User.last_checkpoint, User.pseudo, User.avatar_emoji,
+    ):
+        due = []
+        for u in rows:
+            next_ms = next((m for m in MILESTONES if m > u.last_checkpoint), None)
+            if next_ms:
+                due.append((u, next_ms))
+
+        await bc.run(due, celebrate)
+        # commit par lot : un crash en cours de route garde les checkpoints déjà fêtés
+        await bulk_update_users([
+            {"id": u.id, "last_checkpoint": ms,
+             "next_milestone_at": next_milestone_date(u.quit_date, ms)}
+            for u, ms in due
+        ])
+        await run.advance(rows[-1].id, bc.stats)
+    logging.info("%s", bc.stats)
+    return bc.stats
+
+
+# reprise limitée à 2 h : au-delà, la citation du matin arriverait en pleine journée
+@jobs.job("motivation", "0 * * * *", scopes=lambda now: local_hour_slots(MOTIVATION_HOUR, now),
+          resume_window=2)
+@track_job("motivation")
+async def motivation_notifs_job(run: JobRunHandle):
+    bc = Broadcaster("motivation")
+    slot = LocalSlot.parse(run.scope)
+
+    async def notify(u):
+        try:
+            await bc.call(bot.send_message, u.telegram_id, random.choice(QUOTES))
+        except Exception as e:
+            logging.debug("Motivation DM fail %s: %s", u.telegram_id, e)
 
-        return web.Response(text="ok")
+    # pas d'écriture par user : le cursor est la seule trace de qui a déjà reçu sa citation
+    async for rows in iter_user_chunks(
+        User.telegram_id, where=(User.notifications_enabled == True, User.utc_offset == slot.offset),
+        after_id=run.cursor,
+    ):
+        await bc.run(rows, notify)
+        await run.advance(rows[-1].id, bc.stats)
+    logging.info("%s", bc.stats)
+    return bc.stats
 
-    # (Facultatif) autres events ignorés proprement
-    return web.Response(text="ignored")
 
+# kick = ban temporaire : Telegram le lève seul (moins de 30 s vaudrait ban définitif),
+# un seul appel au lieu de ban + unban ; l'user peut revenir avec un nouveau lien
+KICK_BAN = timedelta(seconds=60)
 
-# =================================================================
-# 1) JOBS TESTABLES (appelables à la main ET par le cron)
-# =================================================================
 
-async def sobriety_check_job():
-    async with async_session() as ses:
-        users = (await ses.execute(select(User))).scalars().all()
-        for u in users:
-            if not u.quit_date:
-                continue
-            days    = (date.today() - u.quit_date).days
-            next_ms = next((m for m in MILESTONES if m > u.last_checkpoint), None)
-            if next_ms and days >= next_ms:
-                # DM
-                try:
-                    await bot.send_message(u.telegram_id, f"🎉 Поздравляю! Сегодня {next_ms} дней трезвости.")
-                except Exception as e:
-                    logging.warning("DM checkpoint failed %s: %s", u.telegram_id, e)
-                # Post auto dans WINS
-                try:
-                    sent = await bot.send_message(
-                        SUPER_GROUP,
-                        message_thread_id=TOPICS["wins"],
-                        text=f"🥳 {u.avatar_emoji} <b>{u.pseudo}</b> празднует <b>{next_ms} дней трезвости.</b>",
-                    )
-                    await bot.edit_message_reply_markup(
-                        SUPER_GROUP, sent.message_id,
-                        reply_markup=post_inline_keyboard(
-                            message_id=sent.message_id,
-                            with_reply=True, with_like=True, with_support=False, likes=0
-                        )
-                    )
-                except Exception as e:
-                    logging.warning("Posting checkpoint failed for %s: %s", u.telegram_id, e)
-                u.last_checkpoint = next_ms
-        await ses.commit()
-
-
-async def motivation_notifs_job():
-    async with async_session() as ses:
-        users = (await ses.execute(
-            select(User).where(User.notifications_enabled == True)
-        )).scalars().all()
-
-        for u in users:
-            try:
-                await bot.send_message(u.telegram_id, random.choice(QUOTES))
-            except Exception as e:
-                logging.debug("Motivation DM fail %s: %s", u.telegram_id, e)
-
-
-async def expire_memberships_job():
+@jobs.job("expire", "5 1 * * *")
+@track_job("expire")
+async def expire_memberships_job(run: JobRunHandle):
     now = datetime.utcnow()
     cutoff = now - timedelta(days=GRACE_DAYS)
-    async with async_session() as ses:
-        expired = (await ses.execute(
-            select(User).where(
-                User.is_member == True,
-                User.paid_until.is_not(None),
-                User.paid_until < cutoff
+    bc = Broadcaster("expire")
+    failed: dict[int, str] = {}
+
+    async def kick(telegram_id: int):
+        try:
+            # until_date calculé à chaque tentative : après une attente (bucket, flood control),
+            # une date fixe tomberait sous les 30 s et le ban deviendrait définitif
+            await bc.call_lazy(lambda: bot.ban_chat_member(
+                SUPER_GROUP, telegram_id, until_date=datetime.now(timezone.utc) + KICK_BAN,
+            ))
+        except Exception as e:
+            failed[telegram_id] = f"{type(e).__name__}: {e}"
+            raise                      # compté en échec ; rejoué au prochain run (member_kicks)
+        try:
+            await bc.call(
+                bot.send_message,
+                telegram_id,
+                "⏳ Срок доступа истёк.\n"
+                "Чтобы вернуться в закрытый клуб, продли подписку:\n"
+                f"{TRIBUTE_URL_TEMPLATE}"
             )
-        )).scalars().all()
-
-        for u in expired:
-            u.is_member = False
-            try:
-                await bot.ban_chat_member(SUPER_GROUP, u.telegram_id)
-                await bot.unban_chat_member(SUPER_GROUP, u.telegram_id)
-            except Exception as e:
-                logging.warning("Remove from group failed %s: %s", u.telegram_id, e)
-            try:
-                await bot.send_message(
-                    u.telegram_id,
-                    "⏳ Срок доступа истёк.\n"
-                    "Чтобы вернуться в закрытый клуб, продли подписку:\n"
-                    f"{TRIBUTE_URL_TEMPLATE}"
-                )
-            except Exception as e:
-                logging.debug("DM renewal fail %s: %s", u.telegram_id, e)
-        await ses.commit()
+        except Exception as e:
+            logging.debug("DM renewal fail %s: %s", telegram_id, e)
+
+    async def kick_all(telegram_ids: list[int]):
+        failed.clear()
+        await bc.run(telegram_ids, kick)
+        await record_kicks([t for t in telegram_ids if t not in failed], dict(failed))
+
+    # 1) exclusions laissées par les runs précédents (échec Telegram, crash après le commit)
+    after = 0
+    while retry := await pending_kicks(after):
+        await kick_all(retry)
+        after = retry[-1]
+
+    # 2) expiration par lots : UPDATE … RETURNING, les lignes traitées sortent du WHERE
+    #    (pas besoin de cursor pour reprendre ; il ne sert qu'au suivi dans /cron_status)
+    while rows := await expire_members_batch(cutoff):
+        await kick_all([r.telegram_id for r in rows])
+        await run.advance(rows[-1].id, bc.stats)
+    logging.info("%s", bc.stats)
+    return bc.stats
 
 # =================================================================
-# 2) PLANNING CRON (les réveils quotidiens) — NE PAS APPELER DIRECTEMENT
+# 2) COMMANDES ADMIN : lancer un job à la main, voir les runs
 # =================================================================
 
-@aiocron.crontab("30 0 * * *")
-async def sobriety_check():
-    await sobriety_check_job()
-
-@aiocron.crontab("0 9 * * *")
-async def motivation_notifs():
-    await motivation_notifs_job()
+async def _launch(msg, job: str, label: str, scopes: list[str] | None = None):
+    """`scopes` : par défaut ceux dus maintenant ; les jobs à l'heure locale passent
+    local_day_slots() (tous les fuseaux, leur date du jour), comme avant les scopes."""
+    if msg.from_user.id not in ADMINS:
+        return
 
-@aiocron.crontab("5 1 * * *")
-async def expire_memberships():
-    await expire_memberships_job()
+    async def report(run: JobRunHandle, error: BaseException | None):
+        scope = f" · {run.scope}" if run.scope else ""
+        text = (f"❌ {label} : échec du run #{run.id}{scope} ({error}) — relancer reprendra au cursor."
+                if error else f"✅ {label} : run #{run.id}{scope} terminé.")
+        try:
+            await msg.answer(text)
+        except Exception as e:
+            logging.debug("Admin report fail: %s", e)
 
-# =================================================================
-# 3) COMMANDES ADMIN POUR TESTER À LA DEMANDE
-# =================================================================
+    try:
+        run = await jobs.trigger(job, on_finish=report, scopes=scopes)
+    except JobLocked as e:
+        return await msg.answer(f"⏳ {label} déjà en cours : {e}")
+    scope = f" · {run.scope}" if run.scope else ""
+    resumed = f", reprise après users.id {run.cursor}" if run.resumed else ""
+    queued = f"\nScopes ({len(scopes)}) : {', '.join(scopes)}" if scopes else ""
+    await msg.answer(f"▶️ {label} lancé (run #{run.id}{scope}{resumed}).{queued}")
 
 @dp.message(F.text == "/cron_checkpoints")
 async def _cron_checkpoints(msg):
-    if msg.from_user.id not in ADMINS:
-        return
-    await sobriety_check_job()
-    await msg.answer("✅ Checkpoints exécutés (manuel).")
+    await _launch(msg, "checkpoints", "Checkpoints", scopes=local_day_slots())
 
 @dp.message(F.text == "/cron_motivation")
 async def _cron_motivation(msg):
-    if msg.from_user.id not in ADMINS:
-        return
-    await motivation_notifs_job()
-    await msg.answer("✅ Motivations envoyées (manuel).")
+    await _launch(msg, "motivation", "Motivations", scopes=local_day_slots())
 
 @dp.message(F.text == "/cron_expire")
 async def _cron_expire(msg):
+    await _launch(msg, "expire", "Expirations")
+
+@dp.message(F.text == "/cron_status")
+async def _cron_status(msg):
     if msg.from_user.id not in ADMINS:
         return
-    await expire_memberships_job()
-    await msg.answer("✅ Expirations traitées (manuel).")
+    blocks = []
+    for name, job in jobs.jobs.items():
+        lines = [f"<b>{name}</b> <code>{job.spec}</code> · prochain {jobs.next_run(name):%d.%m %H:%M} UTC"]
+        for r in await job_history(name):
+            end = r.finished_at or r.heartbeat_at
+            lines.append(
+                f"#{r.id} {r.status}{f' · {r.scope}' if r.scope else ''} · {r.started_at:%d.%m %H:%M} · {(end - r.started_at).total_seconds():.0f}s · "
+                f"{r.processed} ok / {r.failed} err · cursor {r.cursor}"
+                + (f" · {r.resumes} reprise(s)" if r.resumes else "")
+                + (f"\n   {r.error}" if r.error else "")
+            )
+        if len(lines) == 1:
+            lines.append("aucun run")
+        if name == "expire":
+            backlog = await kick_backlog()
+            if backlog:
+                lines.append(f"exclusions : {backlog.get('pending', 0)} à rejouer, "
+                             f"{backlog.get('failed', 0)} abandonnées (member_kicks)")
+        blocks.append("\n".join(lines))
+    await msg.answer("🕑 Crons (UTC)\n\n" + "\n\n".join(blocks))
+
+@dp.message(F.text == "/tg_stats")
+async def _tg_stats(msg):
+    if msg.from_user.id not in ADMINS:
+        return
+    rows = telegram_stats()[:15]
+    if not rows:
+        return await msg.answer("Пока нет запросов к Bot API.")
+    lines = [
+        f"<code>{r['method']}</code> ×{r['count']} · Σ{r['total']:.1f}s · "
+        f"p50 {r['p50'] * 1000:.0f}ms · p95 {r['p95'] * 1000:.0f}ms · "
+        f"err {r['errors']} · 429 {r['retry_after']}"
+        for r in rows
+    ]
+    await msg.answer("📡 Bot API\n" + "\n".join(lines))
+
+@dp.message(F.text == "/latency")
+async def _latency(msg):
+    if msg.from_user.id not in ADMINS:
+        return
+    rows = latency_summary()[:15]
+    if not rows:
+        return await msg.answer("Пока нет данных.")
+    lines = [
+        f"<code>{r['handler']}</code> ×{r['count']} · p50 {r['p50'] * 1000:.0f} · "
+        f"p95 {r['p95'] * 1000:.0f} · p99 {r['p99'] * 1000:.0f} ms"
+        for r in rows
+    ]
+    await msg.answer("⏱ Латентность по хендлерам\n" + "\n".join(lines))
 
 
 # ───────────────────────────  aiohttp
 app = web.Application()
-app.add_routes([web.post("/webhook", handle_webhook)])
+app.add_routes([
+    web.post("/webhook", tribute_worker.handle),
+    web.get("/metrics", metrics_handler),
+])
 
-async def start_webhook():
+async def start_webhook() -> web.AppRunner:
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", 8080)
     await site.start()
+    return runner
+
+def setup_telegram_webhook(in_background: bool = True):
+    """Monte le handler aiogram sur le même `app` que Tribute (avant runner.setup())."""
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=TELEGRAM_WEBHOOK_SECRET,
+        handle_in_background=in_background,
+    ).register(app, path=TELEGRAM_WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)   # on_shutdown → dp.shutdown → flush FSM
+
+# ───────────────────────────  Workers (WORKERS > 1)
+# Traitées par l'ingress : les crons y tournent, et les stats y sont agrégées
+INGRESS_COMMANDS = {
+    "/cron_checkpoints", "/cron_motivation", "/cron_expire", "/cron_status", "/tg_stats", "/latency",
+}
+
+def _on_ingress(update) -> bool:
+    text = update.message.text if update.message is not None else None
+    return bool(text) and text.split()[0].split("@")[0] in INGRESS_COMMANDS
+
+def _worker(index: int, queue, reports) -> None:
+    """Process worker : ce module y est ré-importé (spawn), d'où `dp` et `bot` propres au process."""
+    run_worker(dp, bot, index, queue, reports)
 
 # ───────────────────────────  Main
 async def main():
-    asyncio.create_task(start_webhook())
     await set_bot_commands(bot)
-    await dp.start_polling(bot)
+    jobs.start()       # crons : ici seulement (ingress), jamais dans les workers
+    asyncio.create_task(tribute_worker.run())
+    allowed_updates = dp.resolve_used_update_types()
+
+    pool = None
+    if WORKERS > 1:
+        if FSM_STORAGE == "memory":
+            logging.warning("FSM_STORAGE=memory avec %s workers : l'état FSM ne survit pas "
+                            "au redémarrage d'un worker", WORKERS)
+        pool = WorkerPool(_worker, WORKERS, local=_on_ingress)
+        pool.start()
+        dp.update.outer_middleware(pool)   # l'ingress ne fait plus que router
+    # ingress : envoi séquentiel vers les files = ordre des updates préservé
+    sequential = pool is not None
+
+    try:
+        if not TELEGRAM_WEBHOOK_URL:
+            asyncio.create_task(start_webhook())
+            await dp.start_polling(bot, allowed_updates=allowed_updates, handle_as_tasks=not sequential)
+            return
+
+        # Mode webhook : Telegram pousse les updates sur le même serveur HTTP que Tribute
+        setup_telegram_webhook(in_background=not sequential)
+        runner = await start_webhook()
+        await bot.set_webhook(
+            TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+        )
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await bot.session.close()
+    finally:
+        if pool is not None:
+            await pool.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import yaml
 from dotenv import load_dotenv
@@ -11,6 +12,27 @@ with open("config.yml", "r", encoding="utf-8") as f:
 # Secrets et connexions
 TOKEN = os.getenv("TELEGRAM_TOKEN")
 DB_PATH = os.getenv("DB_PATH", "sqlite:///db.sqlite3")
+DB_PROFILE = os.getenv("DB_PROFILE", "default")   # "default" | "wal" (SQLite haute concurrence)
+
+# Webhook Telegram (vide = long polling) : ex. https://bot.example.com
+TELEGRAM_WEBHOOK_URL    = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+TELEGRAM_WEBHOOK_PATH   = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram")
+# en-tête X-Telegram-Bot-Api-Secret-Token ; dérivé du token si non fourni
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET") or (
+    hashlib.sha256(TOKEN.encode()).hexdigest()[:32] if TOKEN else None
+)
+
+# /metrics (format Prometheus) : si défini, exige "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+SLOW_UPDATE_MS = cfg.get("slow_update_ms", 1000)   # au-delà : log avec répartition DB / Telegram
+LATENCY_WINDOW = cfg.get("latency_window", 1000)   # dernières durées gardées par handler (p50/p95/p99)
+SLOW_QUERY_MS   = cfg.get("slow_query_ms", 100)    # au-delà : log de la requête + EXPLAIN QUERY PLAN
+SQL_REPEAT_WARN = cfg.get("sql_repeat_warn", 5)    # même requête répétée N fois dans un update : N+1 probable
+
+# Mode multi-process (services/workers.py) : 1 = tout dans un seul process
+WORKERS            = int(os.getenv("WORKERS", "1"))
+WORKER_QUEUE_SIZE  = cfg.get("worker_queue_size", 1000)    # updates en attente max par worker
+WORKER_CONCURRENCY = cfg.get("worker_concurrency", 100)    # updates traités en parallèle par worker
 
 # IDs Telegram
 SUPER_GROUP = int(cfg["super_group"])
@@ -30,4 +52,58 @@ MILESTONES = cfg.get("milestones", [7, 30, 60, 90, 100, 180, 365])
 TRIAL_DAYS    = 90
 GRACE_DAYS    = 2
 FOUNDERS_CAP  = 100
-TRIBUTE_URL_TEMPLATE = "https://t.me/tribute/app?startapp=swg0"
\ No newline at end of file
+TRIBUTE_URL_TEMPLATE = "https://t.me/tribute/app?startapp=swg0"
+
+# Envois en masse (crons) : limite globale Telegram ~30 msg/s
+BROADCAST_RATE        = cfg.get("broadcast_rate", 25)
+BROADCAST_CONCURRENCY = cfg.get("broadcast_concurrency", 20)
+GROUP_RATE_PER_MIN    = cfg.get("group_rate_per_min", 20)   # messages/min vers un même groupe (limite Telegram)
+
+# Crons (services/jobs.py) : verrou, reprise après crash, historique
+JOB_LOCK_TTL      = cfg.get("job_lock_ttl", 600)          # s sans heartbeat → run considéré orphelin
+JOB_HEARTBEAT     = cfg.get("job_heartbeat", 60)          # s entre deux heartbeats d'un run
+JOB_RESUME_WINDOW = cfg.get("job_resume_window_h", 20)    # h : au-delà, un run inachevé n'est plus repris
+JOB_HISTORY       = cfg.get("job_history", 200)           # runs gardés par job (horaires : ~1 par fuseau et par jour)
+
+# Expiration des abonnements : exclusions du groupe rejouées au run suivant en cas d'échec
+KICK_MAX_ATTEMPTS = cfg.get("kick_max_attempts", 5)     # au-delà : "failed", visible dans /cron_status
+
+# Envois à l'heure locale des users (users.utc_offset, en heures) : crons horaires par fuseau
+DEFAULT_UTC_OFFSET = cfg.get("default_utc_offset", 3)    # Moscou, tant que l'user n'a rien choisi
+MOTIVATION_HOUR    = cfg.get("motivation_hour", 9)       # heure locale de la citation du jour
+CHECKPOINT_HOUR    = cfg.get("checkpoint_hour", 10)      # heure locale des félicitations de palier
+
+# Session HTTP du Bot (services/telegram_session.py)
+TG_POOL_SIZE  = cfg.get("tg_pool_size", 100)    # connexions simultanées vers api.telegram.org
+TG_KEEPALIVE  = cfg.get("tg_keepalive", 30)     # secondes avant fermeture d'une connexion inactive
+TG_DNS_TTL    = cfg.get("tg_dns_ttl", 3600)
+TG_TIMEOUT    = cfg.get("tg_timeout", 30)       # défaut par requête, en secondes
+TG_METHOD_TIMEOUTS = {
+    "answerCallbackQuery": 5,       # inutile au-delà : le client Telegram a abandonné
+    "sendMessage": 15,
+    "editMessageText": 15,
+    "editMessageReplyMarkup": 10,
+    "banChatMember": 15,
+    "unbanChatMember": 15,
+    **cfg.get("tg_method_timeouts", {}),
+}
+
+# Cache mémoire des lectures User / Post (database/utils.py)
+ENTITY_CACHE_SIZE = cfg.get("entity_cache_size", 10000)
+ENTITY_CACHE_TTL  = cfg.get("entity_cache_ttl", 60)   # secondes
+FREE90_CACHE_TTL  = cfg.get("free90_cache_ttl", 5)    # bannière /start (places 90j restantes)
+
+# Fenêtre de regroupement des éditions de clavier (likes), en secondes
+EDIT_COALESCE_WINDOW = cfg.get("edit_coalesce_window", 1.0)
+
+# Profil SQLite "wal" (database/database.py)
+DB_READ_POOL    = cfg.get("db_read_pool", 8)            # connexions lecture seule
+DB_BUSY_TIMEOUT = cfg.get("db_busy_timeout_ms", 5000)
+DB_CACHE_SIZE   = cfg.get("db_cache_size_kb", 64000)    # PRAGMA cache_size = -N (KiB)
+DB_MMAP_SIZE    = cfg.get("db_mmap_size", 256 * 1024 * 1024)
+
+# Stockage FSM : "sqlite" (défaut), "memory", ou une URL redis:// (serveur compatible Redis)
+FSM_STORAGE        = os.getenv("FSM_STORAGE", "sqlite")
+FSM_TTL            = cfg.get("fsm_ttl", 7 * 24 * 3600)   # secondes d'inactivité avant éviction
+FSM_FLUSH_INTERVAL = cfg.get("fsm_flush_interval", 1.0)  # écritures groupées toutes les N s
+FSM_CACHE_SIZE     = cfg.get("fsm_cache_size", 10000)
@@ -3,14 +3,16 @@ import asyncio
 
 from database.database import engine, Base
 
-from database import user, post, post_like # chaque module contenant un modèle
+from database import user, post, post_like, fsm_state, webhook_event, app_counter, job_run, member_kick # chaque module contenant un modèle
+from database.migrations import upgrade
 
 
 async def create() -> None:
-    """Crée toutes les tables de la base (SQLite ou autre)."""
+    """Crée toutes les tables de la base (SQLite ou autre) puis applique les migrations."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    print("✅ Base de données initialisée avec succès.")
+        version = await upgrade(conn)
+    print(f"✅ Base de données initialisée avec succès (schéma v{version}).")
 
 if __name__ == "__main__":
-    asyncio.run(create())
\ No newline at end of file
+    asyncio.run(create())
@@ -0,0 +1,13 @@
+# database/app_counter.py
+from sqlalchemy import Column, BigInteger, String
+
+from database.database import Base
+
+
+class AppCounter(Base):
+    """Compteurs applicatifs à une ligne (séquence _anonN, …), incrémentés atomiquement."""
+
+    __tablename__ = "app_counters"
+
+    name  = Column(String(64), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
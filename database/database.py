@@ -1,18 +1,62 @@
 # database/database.py
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
-from config import DB_PATH
+from config import (
+    DB_PATH, DB_PROFILE, DB_READ_POOL,
+    DB_BUSY_TIMEOUT, DB_CACHE_SIZE, DB_MMAP_SIZE,
+)
 
 # 1. Créer Base tout de suite
 Base = declarative_base()
 
+
 # 2. Construire l’engine + session
-engine = create_async_engine(DB_PATH, echo=False)
+def _sqlite_pragmas(*, writer: bool):
+    def on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        if writer:
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT)}")
+        cur.execute(f"PRAGMA cache_size=-{int(DB_CACHE_SIZE)}")
+        cur.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+        cur.close()
+    return on_connect
+
+
+_url = make_url(DB_PATH)
+_wal = (
+    DB_PROFILE == "wal"
+    and _url.get_backend_name() == "sqlite"
+    and _url.database not in (None, "", ":memory:")
+)
+
+if _wal:
+    # Profil haute concurrence : WAL + une seule connexion d'écriture (les écritures
+    # font la queue dans le pool au lieu de se battre pour le verrou SQLite)
+    # et un pool de connexions lecture seule qui ne bloquent jamais l'écrivain.
+    engine = create_async_engine(_url, echo=False, pool_size=1, max_overflow=0)
+    read_engine = create_async_engine(
+        _url.set(database=f"file:{_url.database}", query={"mode": "ro", "uri": "true"}),
+        echo=False, pool_size=DB_READ_POOL, max_overflow=0,
+    )
+    event.listen(engine.sync_engine, "connect", _sqlite_pragmas(writer=True))
+    event.listen(read_engine.sync_engine, "connect", _sqlite_pragmas(writer=False))
+else:
+    engine = create_async_engine(DB_PATH, echo=False)
+    read_engine = engine
+
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+# Sessions de lecture : à utiliser pour les SELECT purs (identique à async_session hors profil "wal")
+read_session = sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
 
 # 3. Importer les modèles APRÈS (ils verront déjà Base)
-from database import user, post   # noqa: E402
+from database import user, post, fsm_state, webhook_event, app_counter, job_run, member_kick   # noqa: E402
 
 async def init_db() -> None:
+    from database.migrations import upgrade
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await upgrade(conn)
@@ -0,0 +1,15 @@
+# database/fsm_state.py
+from sqlalchemy import Column, String, Text, DateTime
+
+from database.database import Base
+
+
+class FsmState(Base):
+    """États FSM aiogram persistés (voir database/fsm_storage.py)."""
+
+    __tablename__ = "fsm_states"
+
+    key        = Column(String(128), primary_key=True)    # DefaultKeyBuilder(with_destiny=True)
+    state      = Column(String(128), nullable=True)
+    data       = Column(Text, nullable=False, default="{}")  # JSON
+    updated_at = Column(DateTime, nullable=False, index=True)  # sert à l'éviction TTL
@@ -0,0 +1,225 @@
+# database/fsm_storage.py
+"""Stockage FSM aiogram persistant, à la place de `MemoryStorage`.
+
+• Les états survivent aux redémarrages (table `fsm_states`).
+• Écritures groupées : les clés modifiées sont flushées en une transaction
+  toutes les `flush_interval` secondes, et par `close()` à l'arrêt
+  (`dp.shutdown`, cf. bot.py ; `serve()` pour un worker).
+• Mémoire bornée : cache LRU de `cache_size` clés, les états inactifs depuis
+  `ttl` secondes sont supprimés de la base et du cache (et ne sont plus servis
+  depuis le cache entre deux passes d'éviction).
+"""
+from __future__ import annotations
+
+import asyncio, json, logging, time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import FSM_STORAGE, FSM_TTL, FSM_FLUSH_INTERVAL, FSM_CACHE_SIZE
+from database.database import async_session, read_session
+from database.fsm_state import FsmState
+
+
+# Les données FSM contiennent parfois des dates (onboarding : quit_date)
+def _default(o: Any) -> Any:
+    if isinstance(o, datetime):
+        return {"__datetime__": o.isoformat()}
+    if isinstance(o, date):
+        return {"__date__": o.isoformat()}
+    raise TypeError(f"{type(o).__name__} non sérialisable en JSON")
+
+
+def _object_hook(d: dict) -> Any:
+    if len(d) == 1:
+        if "__date__" in d:
+            return date.fromisoformat(d["__date__"])
+        if "__datetime__" in d:
+            return datetime.fromisoformat(d["__datetime__"])
+    return d
+
+
+def dumps(data: Mapping[str, Any]) -> str:
+    return json.dumps(data, default=_default, ensure_ascii=False)
+
+
+def loads(raw: str | None) -> dict[str, Any]:
+    return json.loads(raw, object_hook=_object_hook) if raw else {}
+
+
+@dataclass
+class _Entry:
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+    touched: float = field(default_factory=time.time)
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(
+        self,
+        *,
+        ttl: float = FSM_TTL,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        cache_size: int = FSM_CACHE_SIZE,
+        key_builder: KeyBuilder | None = None,
+    ):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True, with_bot_id=True)
+        self._cache: OrderedDict[str, _Entry] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flusher: asyncio.Task | None = None
+        self._last_evict = 0.0
+
+    # ─────────────────────────────  lecture  ──────────────────────────────
+    async def _entry(self, key: StorageKey) -> tuple[str, _Entry]:
+        k = self.key_builder.build(key)
+        entry = self._cache.get(k)
+        if entry is not None and entry.touched < time.time() - self.ttl:
+            entry = self._cache[k] = _Entry()      # expiré : comme si la ligne était déjà évincée
+        if entry is None:
+            async with read_session() as ses:
+                row = (await ses.execute(
+                    select(FsmState.state, FsmState.data, FsmState.updated_at).where(FsmState.key == k)
+                )).first()
+            entry = _Entry()
+            if row and row.updated_at >= datetime.utcnow() - timedelta(seconds=self.ttl):
+                touched = row.updated_at.replace(tzinfo=timezone.utc).timestamp()
+                entry = _Entry(row.state, loads(row.data), touched)
+            # un autre handler a pu charger la même clé pendant l'await
+            entry = self._cache.setdefault(k, entry)
+        self._cache.move_to_end(k)
+        self._trim()
+        return k, entry
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, entry = await self._entry(key)
+        return entry.state
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, entry = await self._entry(key)
+        return entry.data.copy()
+
+    # ─────────────────────────────  écriture  ─────────────────────────────
+    def _touch(self, k: str, entry: _Entry) -> None:
+        entry.touched = time.time()
+        self._dirty.add(k)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k, entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._touch(k, entry)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        k, entry = await self._entry(key)
+        entry.data = dict(data)
+        self._touch(k, entry)
+
+    # ─────────────────────────────  flush / TTL  ──────────────────────────
+    async def flush(self) -> None:
+        """Écrit toutes les clés modifiées en une seule transaction."""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for k in keys:
+            entry = self._cache.get(k)
+            if entry is None or entry.empty:
+                deletes.append(k)
+            else:
+                upserts.append({"key": k, "state": entry.state, "data": dumps(entry.data),
+                                "updated_at": datetime.utcfromtimestamp(entry.touched)})
+        try:
+            async with async_session() as ses:
+                if upserts:
+                    stmt = sqlite_insert(FsmState)
+                    await ses.execute(stmt.on_conflict_do_update(
+                        index_elements=[FsmState.key],
+                        set_={"state": stmt.excluded.state, "data": stmt.excluded.data,
+                              "updated_at": stmt.excluded.updated_at},
+                    ), upserts)
+                if deletes:
+                    await ses.execute(delete(FsmState).where(FsmState.key.in_(deletes)))
+                await ses.commit()
+        except BaseException:          # annulation comprise (close() pendant un flush)
+            self._dirty |= keys        # on retentera au prochain tour
+            raise
+
+    async def evict(self) -> None:
+        """Supprime les états inactifs depuis plus de `ttl` (base + cache)."""
+        cutoff = time.time() - self.ttl
+        for k in [k for k, e in self._cache.items() if e.touched < cutoff and k not in self._dirty]:
+            del self._cache[k]
+        async with async_session() as ses:
+            await ses.execute(delete(FsmState).where(
+                FsmState.updated_at < datetime.utcfromtimestamp(cutoff)
+            ))
+            await ses.commit()
+
+    def _trim(self) -> None:
+        # on n'évince du cache que des clés propres (déjà en base)
+        if len(self._cache) <= self.cache_size:
+            return
+        for k in list(self._cache)[:-1]:
+            if len(self._cache) <= self.cache_size:
+                break
+            if k not in self._dirty:
+                del self._cache[k]
+
+    async def _flush_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_evict > min(self.ttl, 3600):
+                    self._last_evict = time.monotonic()
+                    await self.evict()
+            except Exception as e:
+                logging.warning("FSM flush failed: %s", e)
+            self._trim()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __bool__(self) -> bool:
+        # sinon un cache vide est "falsy" et Dispatcher(storage=…) retombe sur MemoryStorage
+        return True
+
+    async def close(self) -> None:
+        """Arrête le flush périodique et écrit ce qui reste ; sans effet si rien n'est en attente."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except BaseException:
+                pass
+            self._flusher = None
+        await self.flush()
+
+
+def build_storage() -> BaseStorage:
+    """Stockage FSM selon FSM_STORAGE : sqlite (défaut), memory, ou redis://…"""
+    if FSM_STORAGE.startswith(("redis://", "rediss://", "unix://")):
+        from aiogram.fsm.storage.redis import RedisStorage   # dépendance optionnelle (redis)
+        return RedisStorage.from_url(
+            FSM_STORAGE,
+            key_builder=DefaultKeyBuilder(with_destiny=True, with_bot_id=True),
+            state_ttl=FSM_TTL, data_ttl=FSM_TTL,
+        )
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLiteStorage()
@@ -0,0 +1,31 @@
+# database/job_run.py
+from sqlalchemy import Column, Index, Integer, String, Text, DateTime, text
+
+from database.database import Base
+
+
+class JobRun(Base):
+    """Exécutions des crons (services/jobs.py) : historique, point de reprise, verrou."""
+
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        # verrou : au plus un run "running" par job
+        Index("ux_job_runs_running", "job", unique=True, sqlite_where=text("status = 'running'")),
+        Index("ix_job_runs_job_id", "job", "id"),
+        Index("ix_job_runs_job_scope", "job", "scope", "id"),
+    )
+
+    id           = Column(Integer, primary_key=True)
+    job          = Column(String(32), nullable=False)
+    scope        = Column(String(32), nullable=True)              # crons horaires : "UTC+3 2026-01-31", sinon NULL
+    status       = Column(String(16), nullable=False, default="running")  # running | done | failed | interrupted
+    cursor       = Column(Integer, nullable=False, default=0)    # dernier users.id traité (reprise)
+    processed    = Column(Integer, nullable=False, default=0)
+    failed       = Column(Integer, nullable=False, default=0)
+    resumes      = Column(Integer, nullable=False, default=0)
+    owner        = Column(String(64), nullable=True)              # host:pid du process qui le tient
+    error        = Column(Text, nullable=True)
+    # UTC naïf, posé côté Python (comparé au heartbeat pour détecter un run orphelin)
+    started_at   = Column(DateTime, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=False)
+    finished_at  = Column(DateTime, nullable=True)
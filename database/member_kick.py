@@ -0,0 +1,16 @@
+# database/member_kick.py
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text
+
+from database.database import Base
+
+
+class MemberKick(Base):
+    """Exclusions du groupe dues à une expiration : écrites avec is_member = 0, supprimées une fois faites."""
+
+    __tablename__ = "member_kicks"
+
+    telegram_id = Column(BigInteger, primary_key=True)
+    status      = Column(String(16), nullable=False, default="pending", index=True)  # pending | failed
+    attempts    = Column(Integer, nullable=False, default=0)
+    error       = Column(Text, nullable=True)
+    expired_at  = Column(DateTime, nullable=False)     # UTC naïf : passage de is_member à 0
@@ -0,0 +1,182 @@
+# database/migrations.py
+"""Migrations versionnées pour mettre à jour une base existante (db.sqlite3) sur place.
+
+• `schema_version` garde la liste des versions déjà appliquées.
+• Chaque migration est idempotente : sur une base neuve, `create_all` a déjà
+  tout créé et la migration ne fait que s'enregistrer.
+• Pour ajouter une migration : écrire `async def _mN(conn)` et l'ajouter à MIGRATIONS.
+  Un nouvel index se crée par son nom (`_create_indexes(conn, Model, "ix_…")`)
+  dans la migration qui ajoute ses colonnes, jamais dans une plus ancienne.
+"""
+from __future__ import annotations
+
+import logging, re
+from typing import Awaitable, Callable
+
+from sqlalchemy import bindparam, func, select, true, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from config import DEFAULT_UTC_OFFSET
+from database.user import User, next_milestone_date
+from database.post import Post
+from database.fsm_state import FsmState
+from database.webhook_event import WebhookEvent
+from database.app_counter import AppCounter
+from database.job_run import JobRun
+from database.member_kick import MemberKick
+
+
+async def _columns(conn: AsyncConnection, table: str) -> set[str]:
+    return {r[1] for r in (await conn.exec_driver_sql(f"PRAGMA table_info({table})")).all()}
+
+
+async def _create_indexes(conn: AsyncConnection, model, *names: str) -> None:
+    """Crée les index `names` du modèle s'ils n'existent pas encore.
+
+    Liste figée par migration : le modèle courant peut déclarer des index sur des
+    colonnes qu'une migration plus récente n'a pas encore ajoutées.
+    """
+    indexes = {ix.name: ix for ix in model.__table__.indexes}
+    for name in names:
+        await conn.run_sync(lambda sync_conn, ix=indexes[name]: ix.create(sync_conn, checkfirst=True))
+
+
+# ───────────────────────────────  Migrations  ─────────────────────────────
+async def _m1_next_milestone_at(conn: AsyncConnection) -> None:
+    if "next_milestone_at" in await _columns(conn, "users"):
+        return
+    await conn.exec_driver_sql("ALTER TABLE users ADD COLUMN next_milestone_at DATE")
+    rows = (await conn.execute(
+        select(User.id, User.quit_date, User.last_checkpoint).where(User.quit_date.is_not(None))
+    )).all()
+    if rows:
+        await conn.execute(
+            update(User).where(User.id == bindparam("b_id"))
+            .values(next_milestone_at=bindparam("b_next")),
+            [{"b_id": r.id, "b_next": next_milestone_date(r.quit_date, r.last_checkpoint)} for r in rows],
+        )
+
+
+async def _m2_likes_count(conn: AsyncConnection) -> None:
+    if "likes_count" in await _columns(conn, "posts"):
+        return
+    await conn.exec_driver_sql("ALTER TABLE posts ADD COLUMN likes_count INTEGER NOT NULL DEFAULT 0")
+    await conn.exec_driver_sql(
+        "UPDATE posts SET likes_count = "
+        "(SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id)"
+    )
+
+
+async def _m3_hot_path_indexes(conn: AsyncConnection) -> None:
+    # post_likes(post_id) est déjà couvert par l'unique (post_id, user_id)
+    await _create_indexes(conn, User, "ix_users_next_milestone_at", "ix_users_member_paid_until",
+                          "ix_users_sober_quit_date")
+    await _create_indexes(conn, Post, "ix_posts_author_created", "ix_posts_parent_id",
+                          "ix_posts_thread_created")
+    await conn.exec_driver_sql("ANALYZE")
+
+
+async def _create_table(conn: AsyncConnection, model) -> None:
+    await conn.run_sync(lambda sync_conn: model.__table__.create(sync_conn, checkfirst=True))
+
+
+async def _m4_fsm_states(conn: AsyncConnection) -> None:
+    await _create_table(conn, FsmState)
+
+
+async def _m5_webhook_events(conn: AsyncConnection) -> None:
+    await _create_table(conn, WebhookEvent)
+
+
+async def _m6_anon_seq(conn: AsyncConnection) -> None:
+    # dernier parcours des pseudos _anonN : la séquence repart du plus grand suffixe
+    await _create_table(conn, AppCounter)
+    pseudos = (await conn.scalars(select(User.pseudo).where(User.pseudo.like("_anon%")))).all()
+    max_n = 0
+    for p in pseudos:
+        m = re.match(r"^_anon(\d*)$", p or "")
+        if m:
+            max_n = max(max_n, int(m.group(1) or 1))   # _anon => 1
+    await conn.execute(
+        sqlite_insert(AppCounter).values(name="anon_seq", value=max_n).on_conflict_do_nothing()
+    )
+
+
+async def _m7_free90_used(conn: AsyncConnection) -> None:
+    used = await conn.scalar(
+        select(func.count()).select_from(User).where(User.free90_claimed == true())
+    )
+    await conn.execute(
+        sqlite_insert(AppCounter).values(name="free90_used", value=used or 0).on_conflict_do_nothing()
+    )
+
+
+async def _m8_sober_stats(conn: AsyncConnection) -> None:
+    # voir database/utils.py (STATS COMMUNAUTÉ) : compteurs tenus à jour à l'écriture
+    dates = (await conn.scalars(
+        select(User.quit_date).where(User.quit_date.is_not(None), User.is_sober == true())
+    )).all()
+    for name, value in (("sober_count", len(dates)), ("sober_ordinal_sum", sum(d.toordinal() for d in dates))):
+        await conn.execute(sqlite_insert(AppCounter).values(name=name, value=value).on_conflict_do_nothing())
+
+
+async def _m9_job_runs(conn: AsyncConnection) -> None:
+    await _create_table(conn, JobRun)
+
+
+async def _m10_utc_offset(conn: AsyncConnection) -> None:
+    if "utc_offset" not in await _columns(conn, "users"):
+        await conn.exec_driver_sql(
+            f"ALTER TABLE users ADD COLUMN utc_offset SMALLINT NOT NULL DEFAULT {int(DEFAULT_UTC_OFFSET)}"
+        )
+    if "scope" not in await _columns(conn, "job_runs"):
+        await conn.exec_driver_sql("ALTER TABLE job_runs ADD COLUMN scope VARCHAR(32)")
+    await _create_indexes(conn, User, "ix_users_notif_offset", "ix_users_offset_next_milestone")
+    await _create_indexes(conn, JobRun, "ix_job_runs_job_scope")
+    await conn.exec_driver_sql("ANALYZE")
+
+
+async def _m11_member_kicks(conn: AsyncConnection) -> None:
+    await _create_table(conn, MemberKick)
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[AsyncConnection], Awaitable[None]]]] = [
+    (1, "users.next_milestone_at", _m1_next_milestone_at),
+    (2, "posts.likes_count", _m2_likes_count),
+    (3, "hot-path indexes", _m3_hot_path_indexes),
+    (4, "fsm_states", _m4_fsm_states),
+    (5, "webhook_events", _m5_webhook_events),
+    (6, "app_counters.anon_seq", _m6_anon_seq),
+    (7, "app_counters.free90_used", _m7_free90_used),
+    (8, "app_counters.sober_stats", _m8_sober_stats),
+    (9, "job_runs", _m9_job_runs),
+    (10, "users.utc_offset, job_runs.scope", _m10_utc_offset),
+    (11, "member_kicks", _m11_member_kicks),
+]
+
+
+# ───────────────────────────────  Runner  ─────────────────────────────────
+async def current_version(conn: AsyncConnection) -> int:
+    await conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY,"
+        " name TEXT NOT NULL,"
+        " applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    return (await conn.exec_driver_sql("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+async def upgrade(conn: AsyncConnection) -> int:
+    """Applique les migrations manquantes (à appeler après create_all). Retourne la version finale."""
+    version = await current_version(conn)
+    for v, name, migrate in MIGRATIONS:
+        if v <= version:
+            continue
+        logging.info("Migration %s: %s", v, name)
+        await migrate(conn)
+        await conn.exec_driver_sql(
+            "INSERT INTO schema_version (version, name) VALUES (?, ?)", (v, name)
+        )
+        version = v
+    return version
@@ -1,5 +1,5 @@
 # database/post.py
-from sqlalchemy import Column, Integer, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Text, Boolean, DateTime, ForeignKey, Index, text as sql_text
 from sqlalchemy.sql import func
 from database.database import Base
 
@@ -12,5 +12,13 @@ class Post(Base):
     parent_id   = Column(Integer, ForeignKey("posts.id"), nullable=True)  # 👈 NEW
     text        = Column(Text)
     reply_count = Column(Integer, default=0)
+    likes_count = Column(Integer, default=0, server_default="0", nullable=False)  # dénormalisé (post_likes)
     created_at  = Column(DateTime(timezone=True), server_default=func.now())
     deleted     = Column(Boolean, default=False)             # ← NEW
+
+    __table_args__ = (
+        # /posts : racines non supprimées d'un auteur, triées par date (index partiel)
+        Index("ix_posts_author_created", "author_id", "created_at", sqlite_where=sql_text("deleted = 0")),
+        Index("ix_posts_parent_id", "parent_id"),
+        Index("ix_posts_thread_created", "thread_id", "created_at"),
+    )
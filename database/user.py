@@ -1,17 +1,38 @@
 from __future__ import annotations
 
-from sqlalchemy import Column, Integer, String, Date, DateTime, BigInteger, Boolean
+from sqlalchemy import Column, Integer, SmallInteger, String, Date, DateTime, BigInteger, Boolean, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+
+from config import DEFAULT_UTC_OFFSET, MILESTONES
 
 from database.database import Base
 
+UTC_OFFSETS = range(-12, 15)      # décalages proposés dans /settings (UTC-12 … UTC+14)
+
+
+def next_milestone_date(quit_date: date | None, last_checkpoint: int | None) -> date | None:
+    """Date à laquelle le prochain palier après `last_checkpoint` est atteint."""
+    if not quit_date:
+        return None
+    next_ms = next((m for m in MILESTONES if m > (last_checkpoint or 0)), None)
+    return quit_date + timedelta(days=next_ms) if next_ms else None
+
 
 class User(Base):
     """Таблица участников клуба."""
 
     __tablename__ = "users"
+    __table_args__ = (
+        # cron d'expiration : membres actifs seulement (index partiel)
+        Index("ix_users_member_paid_until", "paid_until", sqlite_where=text("is_member = 1")),
+        # compteur "трезвых сегодня"
+        Index("ix_users_sober_quit_date", "is_sober", "quit_date"),
+        # crons horaires (un fuseau par run) : citations, puis paliers dus
+        Index("ix_users_notif_offset", "utc_offset", "id", sqlite_where=text("notifications_enabled = 1")),
+        Index("ix_users_offset_next_milestone", "utc_offset", "next_milestone_at"),
+    )
 
     id:            Mapped[int]  = mapped_column(Integer, primary_key=True, autoincrement=True)
     # BigInteger pour couvrir tous les Telegram IDs
@@ -27,7 +48,11 @@ class User(Base):
     is_member:     Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     notifications_enabled: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     last_checkpoint: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # date du prochain palier (quit_date + milestone suivant) → le cron fait un range scan
+    next_milestone_at: Mapped[date | None] = mapped_column(Date, nullable=True, index=True)
     is_sober:      Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    # décalage UTC en heures : heure locale des envois planifiés
+    utc_offset:    Mapped[int] = mapped_column(SmallInteger, default=DEFAULT_UTC_OFFSET, nullable=False)
 
     # Un SEUL chrono d’accès (sert aussi pour les 90j gratuits)
     paid_until:    Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -38,6 +63,10 @@ class User(Base):
     # Flag pour compter les 100 gratuits (offre 90 jours)
     free90_claimed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
+    def sync_next_milestone(self) -> None:
+        """À appeler après chaque changement de quit_date / last_checkpoint."""
+        self.next_milestone_at = next_milestone_date(self.quit_date, self.last_checkpoint)
+
     def is_active_member(self) -> bool:
         now = datetime.utcnow()
         return bool(self.paid_until and self.paid_until >= now)
@@ -1,16 +1,30 @@
 from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
-from typing import Iterable, Sequence
-import re
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Hashable, Iterable, Sequence
+import time
 
-from sqlalchemy import select, update, func
+from sqlalchemy import bindparam, case, delete, event, false, true, inspect, select, update, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
 
-from database.database import async_session
-from database.user import User
+from config import (
+    ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL, FREE90_CACHE_TTL,
+    AVG_HOURS_DAY, AVG_COST_DAY, KICK_MAX_ATTEMPTS,
+)
+
+from database.database import async_session, read_session
+from database.user import User, next_milestone_date
 from database.post import Post
+from database.post_like import PostLike
+from database.app_counter import AppCounter
+from database.member_kick import MemberKick
 
 FREE90_LIMIT = 100  # nombre de places gratuites 90j
+USER_CHUNK   = 1000  # taille des lots pour les parcours de users (crons)
 
 
 # ───────────────────────────────  SESSION  ────────────────────────────────
@@ -23,17 +37,322 @@ async def get_session():
             await session.close()
 
 
+@asynccontextmanager
+async def get_read_session():
+    """Session pour les SELECT purs (pool lecture seule en profil "wal")."""
+    async with read_session() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+# ───────────────────────────────  CACHE  ──────────────────────────────────
+# Mode multi-process (services/workers.py) : chaque invalidation locale est aussi
+# passée à ce hook, qui la relaie aux autres process (apply_invalidations()).
+_invalidation_hook: Callable[[str, Hashable | None], None] | None = None
+
+
+def set_invalidation_hook(hook: Callable[[str, Hashable | None], None] | None) -> None:
+    global _invalidation_hook
+    _invalidation_hook = hook
+
+
+class EntityCache:
+    """
+    Cache LRU + TTL en mémoire pour les lectures chaudes (User par telegram_id, Post par id).
+    Les objets sont détachés (expire_on_commit=False) : à traiter en lecture seule.
+
+    Lecture en base puis `set` : prendre `generation()` AVANT la lecture et le passer
+    à `set(..., since=)`. Si la clé a été invalidée entre-temps, la valeur lue est
+    peut-être antérieure à l'écriture : elle n'entre pas dans le cache. Un `set`
+    sans `since` (valeur posée par l'écriture elle-même) compte comme une invalidation.
+    """
+
+    def __init__(self, name: str, maxsize: int = ENTITY_CACHE_SIZE, ttl: float = ENTITY_CACHE_TTL):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        # génération : +1 à chaque invalidation ; dernière invalidation par clé (bornée),
+        # les clés oubliées comptent comme invalidées à `_floor`
+        self._generation = 0
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._floor = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, key: Hashable, value: Any, since: int | None = None) -> None:
+        if since is None:
+            self._bump(key)
+        elif self._invalidated.get(key, self._floor) > since:
+            return                      # invalidée pendant la lecture : valeur peut-être périmée
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self.drop(key)
+        if _invalidation_hook is not None:
+            _invalidation_hook(self.name, key)
+
+    def clear(self) -> None:
+        self.drop(None)
+        if _invalidation_hook is not None:
+            _invalidation_hook(self.name, None)
+
+    def drop(self, key: Hashable | None) -> None:
+        """Retire `key` (None = tout) et avance sa génération, sans relayer aux autres process."""
+        if key is None:
+            self._generation += 1
+            self._data.clear()
+            self._invalidated.clear()
+            self._floor = self._generation
+            return
+        self._data.pop(key, None)
+        self._bump(key)
+
+    def _bump(self, key: Hashable) -> None:
+        self._generation += 1
+        self._invalidated[key] = self._generation
+        self._invalidated.move_to_end(key)
+        if len(self._invalidated) > self.maxsize:
+            _, generation = self._invalidated.popitem(last=False)
+            self._floor = max(self._floor, generation)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+user_cache = EntityCache("user")
+post_cache = EntityCache("post")
+counter_cache = EntityCache("counter", maxsize=64, ttl=FREE90_CACHE_TTL)
+
+
+CACHES = {c.name: c for c in (user_cache, post_cache, counter_cache)}
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {name: c.stats() for name, c in CACHES.items()}
+
+
+def apply_invalidations(batch: Iterable[tuple[str, Hashable | None]]) -> None:
+    """Invalidations reçues d'un autre process (clé None = tout le cache) ; pas relayées."""
+    for name, key in batch:
+        CACHES[name].drop(key)
+
+
+# Écritures ORM (ses.add / attribut modifié + commit) : invalidation au commit.
+# Les UPDATE "Core" (update(User)...) invalident explicitement dans leurs helpers.
+@event.listens_for(Session, "after_flush")
+def _collect_dirty(session, flush_context):
+    dirty = session.info.setdefault("cache_dirty", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            dirty.add((user_cache, obj.telegram_id))
+        elif isinstance(obj, Post):
+            dirty.add((post_cache, obj.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_dirty(session):
+    for cache, key in session.info.pop("cache_dirty", ()):
+        cache.invalidate(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_dirty(session):
+    session.info.pop("cache_dirty", None)
+
+
 # ───────────────────────────────  USERS  ──────────────────────────────────
 async def get_user(telegram_id: int) -> User | None:
-    async with get_session() as ses:
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        return user
+    since = user_cache.generation()
+    async with get_read_session() as ses:
         res = await ses.execute(select(User).where(User.telegram_id == telegram_id))
-        return res.scalar_one_or_none()
+        user = res.scalar_one_or_none()
+    if user is not None:
+        user_cache.set(telegram_id, user, since=since)
+    return user
 
 
 async def update_user(telegram_id: int, **kwargs) -> None:
     async with get_session() as ses:
+        if {"quit_date", "last_checkpoint", "is_sober"} & kwargs.keys():
+            cur = (await ses.execute(
+                select(User.quit_date, User.last_checkpoint, User.is_sober)
+                .where(User.telegram_id == telegram_id)
+            )).first()
+            if cur:
+                new = {k: kwargs.get(k, getattr(cur, k)) for k in cur._fields}
+                # garde next_milestone_at cohérent si la date ou le palier change
+                kwargs.setdefault("next_milestone_at", next_milestone_date(new["quit_date"], new["last_checkpoint"]))
+                # update "Core" : pas d'événement de flush, les stats communauté sont ajustées ici
+                for stmt in _sober_delta(_sober_key(cur.quit_date, cur.is_sober),
+                                         _sober_key(new["quit_date"], new["is_sober"])):
+                    await ses.execute(stmt)
         await ses.execute(update(User).where(User.telegram_id == telegram_id).values(**kwargs))
         await ses.commit()
+    user_cache.invalidate(telegram_id)
+
+
+async def iter_user_chunks(*columns, where: Sequence = (), chunk_size: int = USER_CHUNK,
+                           after_id: int = 0) -> AsyncIterator[list[Row]]:
+    """
+    Parcourt `users` par lots (pagination keyset sur User.id), en ne chargeant que `columns`.
+    Chaque lot est lu dans sa propre session : l'appelant commit ses écritures lot par lot.
+    `after_id` : reprise d'un parcours interrompu (cursor d'un run de cron).
+    """
+    last_id = after_id
+    while True:
+        async with get_read_session() as ses:
+            rows = (await ses.execute(
+                select(User.id, *columns)
+                .where(User.id > last_id, *where)
+                .order_by(User.id)
+                .limit(chunk_size)
+            )).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+async def iter_users_by_id(ids: Sequence[int], *columns, chunk_size: int = USER_CHUNK) -> AsyncIterator[list[Row]]:
+    """Comme iter_user_chunks, pour une liste d'ids déjà sélectionnés via un index."""
+    for i in range(0, len(ids), chunk_size):
+        async with get_read_session() as ses:
+            rows = (await ses.execute(
+                select(User.id, *columns)
+                .where(User.id.in_(ids[i:i + chunk_size]))
+                .order_by(User.id)
+            )).all()
+        yield rows
+
+
+async def due_milestone_user_ids(today: date, after_id: int = 0,
+                                 utc_offset: int | None = None) -> list[int]:
+    """Ids des users dont le prochain palier est atteint (range scan sur l'index).
+
+    `utc_offset` : un seul fuseau, `today` étant alors sa date locale.
+    """
+    where = [User.next_milestone_at <= today, User.id > after_id]
+    if utc_offset is not None:
+        where.append(User.utc_offset == utc_offset)
+    async with get_read_session() as ses:
+        ids = (await ses.scalars(select(User.id).where(*where))).all()
+    return sorted(ids)
+
+
+# ─────────────────────  Expiration des abonnements  ──────────────────────
+# is_member passe à 0 par lots, en SQL, et chaque exclusion à faire est écrite
+# dans member_kicks dans la même transaction : un crash après le commit ne perd
+# aucune exclusion, un échec Telegram est rejoué au run suivant.
+async def expire_members_batch(cutoff: datetime, limit: int = USER_CHUNK) -> list[Row]:
+    """Expire au plus `limit` membres dont l'accès a pris fin avant `cutoff` ; renvoie (id, telegram_id)."""
+    # pas d'ORDER BY : les lignes traitées sortent du WHERE, le LIMIT s'arrête dans l'index
+    picked = select(User.id).where(
+        User.is_member == true(), User.paid_until.is_not(None), User.paid_until < cutoff,
+    ).limit(limit)
+    async with get_session() as ses:
+        rows = (await ses.execute(
+            update(User).where(User.id.in_(picked)).values(is_member=False)
+            .returning(User.id, User.telegram_id)
+            .execution_options(synchronize_session=False)
+        )).all()
+        if rows:
+            now = datetime.utcnow()
+            stmt = sqlite_insert(MemberKick).values(
+                [{"telegram_id": r.telegram_id, "expired_at": now} for r in rows]
+            )
+            await ses.execute(stmt.on_conflict_do_update(
+                index_elements=[MemberKick.telegram_id],
+                set_={"status": "pending", "attempts": 0, "error": None, "expired_at": now},
+            ))
+        await ses.commit()
+    for r in rows:
+        user_cache.invalidate(r.telegram_id)
+    return sorted(rows, key=lambda r: r.id)
+
+
+async def pending_kicks(after: int = 0, limit: int = USER_CHUNK) -> list[int]:
+    """telegram_id des exclusions encore à faire (keyset sur telegram_id)."""
+    async with get_session() as ses:
+        # redevenu membre entre-temps (paiement, offre 90 j) : surtout ne pas l'exclure
+        await ses.execute(delete(MemberKick).where(
+            MemberKick.telegram_id.in_(select(User.telegram_id).where(User.is_member == true()))
+        ))
+        ids = (await ses.scalars(
+            select(MemberKick.telegram_id)
+            .where(MemberKick.status == "pending", MemberKick.telegram_id > after)
+            .order_by(MemberKick.telegram_id).limit(limit)
+        )).all()
+        await ses.commit()
+    return list(ids)
+
+
+async def record_kicks(done: Sequence[int], failed: dict[int, str]) -> None:
+    """Supprime les exclusions faites ; compte une tentative pour les autres."""
+    async with get_session() as ses:
+        if done:
+            await ses.execute(delete(MemberKick).where(MemberKick.telegram_id.in_(done)))
+        if failed:
+            # table Core (pas l'entité) : executemany avec WHERE sur bindparam, sans "bulk by PK" de l'ORM
+            kicks = MemberKick.__table__
+            attempts = kicks.c.attempts + 1
+            await ses.execute(
+                update(kicks).where(kicks.c.telegram_id == bindparam("b_tid")).values(
+                    attempts=attempts, error=bindparam("b_error"),
+                    status=case((attempts >= KICK_MAX_ATTEMPTS, "failed"), else_="pending"),
+                ),
+                [{"b_tid": tid, "b_error": error[:500]} for tid, error in failed.items()],
+            )
+        await ses.commit()
+
+
+async def kick_backlog() -> dict[str, int]:
+    """Exclusions en attente / abandonnées, par statut (pour /cron_status)."""
+    async with get_read_session() as ses:
+        rows = (await ses.execute(
+            select(MemberKick.status, func.count()).group_by(MemberKick.status)
+        )).all()
+    return {status: n for status, n in rows}
+
+
+async def bulk_update_users(values: Sequence[dict]) -> None:
+    """UPDATE par clé primaire en un seul executemany : [{"id": 1, "champ": v}, ...].
+
+    Seuls les users du lot sortent du cache (indexé par telegram_id, relu ici par PK).
+    """
+    if not values:
+        return
+    async with get_session() as ses:
+        await ses.execute(update(User), list(values))
+        telegram_ids = (await ses.scalars(
+            select(User.telegram_id).where(User.id.in_([v["id"] for v in values]))
+        )).all()
+        await ses.commit()
+    for telegram_id in telegram_ids:
+        user_cache.invalidate(telegram_id)
 
 
 # Anciens helpers (garde-les si d'autres modules les utilisent)
@@ -45,36 +364,75 @@ async def create_user(telegram_id: int, pseudo: str, emoji: str = "👤") -> Use
         return user
 
 
-_ANON_RE = re.compile(r"^_anon(\d*)$")   # capte suffixe numérique (optionnel)
+def _counter_upsert(name: str, delta: int):
+    stmt = sqlite_insert(AppCounter).values(name=name, value=delta)
+    return stmt.on_conflict_do_update(
+        index_elements=[AppCounter.name],
+        set_={"value": AppCounter.value + delta},
+    )
+
+
+async def bump_counter(ses, name: str, delta: int = 1) -> int:
+    """
+    Incrémente atomiquement le compteur `name` (créé à 0 s'il manque) et retourne
+    la nouvelle valeur. Prend le verrou d'écriture : à appeler dans la transaction
+    qui consomme la valeur.
+    """
+    return await ses.scalar(_counter_upsert(name, delta).returning(AppCounter.value))
+
+
+async def _next_anon_pseudo(ses) -> str:
+    """_anon, _anon2, _anon3… sans collision (séquence app_counters.anon_seq)."""
+    n = await bump_counter(ses, "anon_seq")
+    return "_anon" if n == 1 else f"_anon{n}"
+
 
 async def create_user_stub(tg_id: int) -> None:
     """
     Ajoute _anon, _anon2, _anon3… sans collision.
     """
     async with async_session() as ses:
-        pseudos = (await ses.scalars(select(User.pseudo).where(User.pseudo.like("_anon%")))).all()
+        ses.add(User(telegram_id=tg_id, pseudo=await _next_anon_pseudo(ses), avatar_emoji="👤"))
+        await ses.commit()
 
-        max_n = 0
-        for p in pseudos:
-            m = _ANON_RE.match(p or "")
-            if m:
-                n = int(m.group(1) or 1)   # _anon => 1
-                max_n = max(max_n, n)
 
-        next_pseudo = "_anon" if max_n == 0 else f"_anon{max_n + 1}"
-        ses.add(User(telegram_id=tg_id, pseudo=next_pseudo, avatar_emoji="👤"))
+async def upsert_membership(telegram_id: int, paid_until: datetime) -> None:
+    """
+    Active l'abonnement (webhook Tribute) en une transaction :
+    UPDATE si le user existe, sinon INSERT d'un stub _anonN déjà membre.
+    """
+    async with get_session() as ses:
+        res = await ses.execute(
+            update(User).where(User.telegram_id == telegram_id)
+            .values(is_member=True, paid_until=paid_until)
+        )
+        if res.rowcount == 0:
+            stmt = sqlite_insert(User).values(
+                telegram_id=telegram_id, pseudo=await _next_anon_pseudo(ses), avatar_emoji="👤",
+                is_member=True, paid_until=paid_until,
+            )
+            await ses.execute(stmt.on_conflict_do_update(
+                index_elements=[User.telegram_id],
+                set_={"is_member": True, "paid_until": paid_until},
+            ))
+        # renouvelé avant que l'exclusion ait pu se faire : on l'annule
+        await ses.execute(delete(MemberKick).where(MemberKick.telegram_id == telegram_id))
         await ses.commit()
+    user_cache.invalidate(telegram_id)
 
 
 # ─────────────────────  Offre 90 jours gratuits  ─────────────────────────
+# Places prises = compteur app_counters.free90_used (plus de COUNT(*) sur users).
 async def free90_slots_left() -> int:
-    async with async_session() as ses:
-        used = await ses.scalar(
-            select(func.count()).select_from(User).where(User.free90_claimed == True)
-        )
-        used = used or 0
-        left = FREE90_LIMIT - used
-        return left if left > 0 else 0
+    left = counter_cache.get("free90_left")
+    if left is not None:
+        return left
+    since = counter_cache.generation()
+    async with get_read_session() as ses:
+        used = await ses.scalar(select(AppCounter.value).where(AppCounter.name == "free90_used")) or 0
+    left = max(FREE90_LIMIT - used, 0)
+    counter_cache.set("free90_left", left, since=since)
+    return left
 
 
 async def claim_free90(telegram_id: int) -> bool:
@@ -82,47 +440,142 @@ async def claim_free90(telegram_id: int) -> bool:
     Attribue 90 jours gratuits en empilant dans paid_until.
     Retourne True si succès (idempotent si déjà pris), False si plus de places.
     """
-    async with async_session() as ses:
-        # recheck slots dans la même transaction
-        used = await ses.scalar(
-            select(func.count()).select_from(User).where(User.free90_claimed == True)
+    async with get_session() as ses:
+        # 1) flag basculé une seule fois par user (prend le verrou d'écriture)
+        res = await ses.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id, User.free90_claimed == false())
+            .values(free90_claimed=True)
+            .returning(User.paid_until)
         )
-        used = used or 0
-        if used >= FREE90_LIMIT:
-            return False
-
-        user = await ses.scalar(select(User).where(User.telegram_id == telegram_id))
-        if not user:
+        row = res.first()
+        if row is None:
+            if await ses.scalar(select(User.id).where(User.telegram_id == telegram_id)):
+                # déjà pris → success idempotent
+                return True
             # stub minimal
-            user = User(telegram_id=telegram_id, pseudo=f"_anon{telegram_id}", avatar_emoji="👤")
-            ses.add(user)
+            ses.add(User(telegram_id=telegram_id, pseudo=await _next_anon_pseudo(ses),
+                         avatar_emoji="👤", free90_claimed=True))
             await ses.flush()
+            paid_until = None
+        else:
+            paid_until = row.paid_until
 
-        if user.free90_claimed:
-            # déjà pris → success idempotent
-            return True
+        # 2) place réservée par incrément conditionnel : jamais plus de FREE90_LIMIT
+        stmt = sqlite_insert(AppCounter).values(name="free90_used", value=1)
+        used = await ses.scalar(
+            stmt.on_conflict_do_update(
+                index_elements=[AppCounter.name],
+                set_={"value": AppCounter.value + 1},
+                where=AppCounter.value < FREE90_LIMIT,
+            ).returning(AppCounter.value)
+        )
+        if used is None:
+            await ses.rollback()
+            counter_cache.set("free90_left", 0)
+            return False
 
         now = datetime.utcnow()
         # si l’utilisateur a déjà un paid_until dans le futur, on empile, sinon on part de now
-        base = user.paid_until if (user.paid_until and user.paid_until > now) else now
-        user.paid_until = base + timedelta(days=90)
-        user.is_member = True
-        user.free90_claimed = True
-
+        base = paid_until if (paid_until and paid_until > now) else now
+        await ses.execute(
+            update(User).where(User.telegram_id == telegram_id)
+            .values(paid_until=base + timedelta(days=90), is_member=True)
+        )
         await ses.commit()
-        return True
+    counter_cache.set("free90_left", max(FREE90_LIMIT - used, 0))
+    user_cache.invalidate(telegram_id)
+    return True
+
+
+# ─────────────────────────  STATS COMMUNAUTÉ  ────────────────────────────
+# "Трезвых сегодня" et jours cumulés, tenus à jour à chaque écriture de
+# quit_date / is_sober au lieu d'un COUNT(*) sur users à chaque /counter :
+#   sober_count        = nb de users avec quit_date et is_sober
+#   sober_ordinal_sum  = Σ quit_date.toordinal() de ces users
+# → jours cumulés = sober_count × today.toordinal() − sober_ordinal_sum
+SOBER_COUNT       = "sober_count"
+SOBER_ORDINAL_SUM = "sober_ordinal_sum"
+
+
+def _sober_key(quit_date: date | None, is_sober: bool | None) -> tuple[int, int]:
+    """Contribution d'un user aux deux compteurs."""
+    return (1, quit_date.toordinal()) if quit_date and is_sober else (0, 0)
+
+
+def _sober_delta(old: tuple[int, int], new: tuple[int, int]) -> list:
+    """UPSERTs à exécuter pour passer de la contribution `old` à `new`."""
+    deltas = ((SOBER_COUNT, new[0] - old[0]), (SOBER_ORDINAL_SUM, new[1] - old[1]))
+    return [_counter_upsert(name, d) for name, d in deltas if d]
+
+
+def _history_value(obj: User, attr: str, *, old: bool):
+    hist = inspect(obj).attrs[attr].history
+    if hist.unchanged:
+        return hist.unchanged[0]
+    if hist.added or hist.deleted:
+        # ancienne valeur absente : attribut jamais chargé ni posé (objet tout juste inséré) = NULL
+        values = hist.deleted if old else hist.added
+        return values[0] if values else None
+    return getattr(obj, attr)
+
+
+# Écritures ORM (onboarding, /counter, relapse) : delta calculé dans la même transaction.
+# Les UPDATE "Core" passent par update_user ; bulk_update_users ne touche pas ces colonnes.
+@event.listens_for(Session, "after_flush")
+def _track_sober_stats(session, flush_context):
+    old_total = new_total = (0, 0)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, User):
+            continue
+        old = (0, 0) if obj in session.new else _sober_key(
+            _history_value(obj, "quit_date", old=True), _history_value(obj, "is_sober", old=True),
+        )
+        new = (0, 0) if obj in session.deleted else _sober_key(
+            _history_value(obj, "quit_date", old=False), _history_value(obj, "is_sober", old=False),
+        )
+        old_total = (old_total[0] + old[0], old_total[1] + old[1])
+        new_total = (new_total[0] + new[0], new_total[1] + new[1])
+    for stmt in _sober_delta(old_total, new_total):
+        session.connection().execute(stmt)
+
+
+@dataclass
+class CommunityStats:
+    sober: int
+    days: int
+
+    @property
+    def hours(self) -> int:
+        return self.days * AVG_HOURS_DAY
+
+    @property
+    def money(self) -> int:
+        return self.days * AVG_COST_DAY
+
+
+async def community_stats(today: date | None = None) -> CommunityStats:
+    """Stats de la communauté en une lecture par clé primaire (app_counters)."""
+    today = today or date.today()
+    async with get_read_session() as ses:
+        values = dict((await ses.execute(
+            select(AppCounter.name, AppCounter.value)
+            .where(AppCounter.name.in_((SOBER_COUNT, SOBER_ORDINAL_SUM)))
+        )).all())
+    sober = values.get(SOBER_COUNT, 0)
+    return CommunityStats(sober=sober, days=max(sober * today.toordinal() - values.get(SOBER_ORDINAL_SUM, 0), 0))
 
 
 # ───────────────────────────────  POSTS  ──────────────────────────────────
 async def get_posts_by_user(user_id: int) -> list[Post]:
-    async with get_session() as s:
+    async with get_read_session() as s:
         result = await s.execute(
             select(Post)
             .where(
                 Post.author_id == user_id,
                 Post.parent_id.is_(None),        # racines only
                 Post.reply_count.is_not(None),   # threads racine
-                Post.deleted.is_(False)
+                Post.deleted == false(),         # littéral "= 0" → index partiel
             )
             .order_by(Post.created_at.desc())
         )
@@ -130,11 +583,105 @@ async def get_posts_by_user(user_id: int) -> list[Post]:
 
 
 async def get_post_by_id(post_id: int) -> Post | None:
-    async with get_session() as ses:
-        return await ses.get(Post, post_id)
+    post = post_cache.get(post_id)
+    if post is not None:
+        return post
+    since = post_cache.generation()
+    async with get_read_session() as ses:
+        post = await ses.get(Post, post_id)
+    if post is not None:
+        post_cache.set(post_id, post, since=since)
+    return post
+
+
+async def get_post_with_author(post_id: int) -> tuple[Post, User] | None:
+    """Post + son auteur en une seule requête (jointure sur clé primaire)."""
+    async with get_read_session() as ses:
+        row = (await ses.execute(
+            select(Post, User).join(User, User.id == Post.author_id).where(Post.id == post_id)
+        )).first()
+    return (row.Post, row.User) if row else None
 
 
 async def update_post(post_id: int, **fields):
     async with async_session() as ses:
         await ses.execute(update(Post).where(Post.id == post_id).values(**fields))
         await ses.commit()
+    post_cache.invalidate(post_id)
+
+
+async def add_reply(post_id: int, reply: Post) -> Row | None:
+    """
+    Enregistre une réponse et incrémente reply_count du post d'origine (une transaction).
+    Retourne (reply_count, likes_count) du post d'origine après incrément.
+    """
+    async with get_session() as ses:
+        counts = (await ses.execute(
+            update(Post).where(Post.id == post_id)
+            .values(reply_count=Post.reply_count + 1)
+            .returning(Post.reply_count, Post.likes_count)
+        )).first()
+        ses.add(reply)
+        await ses.commit()
+    post_cache.invalidate(post_id)
+    return counts
+
+
+# ───────────────────────────────  LIKES  ──────────────────────────────────
+async def _count_likes(ses, post_id: int) -> int:
+    # messages sans ligne Post (checkpoints auto du cron) : on retombe sur post_likes
+    return await ses.scalar(
+        select(func.count()).select_from(PostLike).where(PostLike.post_id == post_id)
+    ) or 0
+
+
+async def get_likes_count(post_id: int) -> int:
+    """Compteur ❤️ actuel, lu en base (pas le cache : appelé juste avant d'afficher)."""
+    async with get_read_session() as ses:
+        likes = await ses.scalar(select(Post.likes_count).where(Post.id == post_id))
+        if likes is None:
+            likes = await _count_likes(ses, post_id)
+    return likes
+
+
+async def add_like(post_id: int, user_id: int) -> int | None:
+    """
+    Like idempotent : INSERT … ON CONFLICT DO NOTHING + incrément atomique.
+    Retourne le nouveau compteur, ou None si l'utilisateur avait déjà liké.
+    """
+    async with get_session() as ses:
+        res = await ses.execute(
+            sqlite_insert(PostLike).values(post_id=post_id, user_id=user_id).on_conflict_do_nothing()
+        )
+        if res.rowcount == 0:
+            return None
+        likes = await ses.scalar(
+            update(Post).where(Post.id == post_id)
+            .values(likes_count=Post.likes_count + 1)
+            .returning(Post.likes_count)
+        )
+        if likes is None:
+            likes = await _count_likes(ses, post_id)
+        await ses.commit()
+    post_cache.invalidate(post_id)
+    return likes
+
+
+async def remove_like(post_id: int, user_id: int) -> int | None:
+    """Retire le like. Retourne le nouveau compteur, ou None s'il n'y avait pas de like."""
+    async with get_session() as ses:
+        res = await ses.execute(
+            delete(PostLike).where(PostLike.post_id == post_id, PostLike.user_id == user_id)
+        )
+        if res.rowcount == 0:
+            return None
+        likes = await ses.scalar(
+            update(Post).where(Post.id == post_id)
+            .values(likes_count=Post.likes_count - 1)
+            .returning(Post.likes_count)
+        )
+        if likes is None:
+            likes = await _count_likes(ses, post_id)
+        await ses.commit()
+    post_cache.invalidate(post_id)
+    return likes
@@ -0,0 +1,21 @@
+# database/webhook_event.py
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+
+from database.database import Base
+
+
+class WebhookEvent(Base):
+    """Événements Tribute bruts : enregistrés à la réception, traités en tâche de fond."""
+
+    __tablename__ = "webhook_events"
+
+    id           = Column(Integer, primary_key=True)
+    idem_key     = Column(String(64), unique=True, nullable=False)   # sha256 du corps reçu
+    name         = Column(String(64), nullable=False)
+    body         = Column(Text, nullable=False)
+    status       = Column(String(16), nullable=False, default="pending", index=True)  # pending | done | failed
+    attempts     = Column(Integer, nullable=False, default=0)
+    error        = Column(Text, nullable=True)
+    received_at  = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
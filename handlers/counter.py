@@ -7,11 +7,12 @@ from aiogram.types import (
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from datetime import datetime, date
-from sqlalchemy import select, func
+from sqlalchemy import select
 
 from config import AVG_HOURS_DAY, AVG_NEURONS_DAY, AVG_COST_DAY
 from database.database import async_session
 from database.user import User
+from database.utils import get_user, community_stats
 
 counter_router = Router()
 
@@ -26,20 +27,14 @@ def human_dhms(days: int) -> str:
     m, d = divmod(r, 30)
     return " ".join(f"{n} {u}" for n, u in ((y, "г."), (m, "мес."), (d, "дн.")) if n) or "0 дн."
 
-async def count_currently_sober() -> int:
-    async with async_session() as ses:
-        res = await ses.execute(
-            select(func.count())
-            .select_from(User)
-            .where(User.quit_date.is_not(None), User.is_sober.is_(True))
-        )
-        return res.scalar_one()
-
 async def show_stats(user: User, reply):
     days = (date.today() - user.quit_date).days
-    total_sober = await count_currently_sober()
+    community = await community_stats()
 
-    header = f"📊 Сегодня трезвых: <b>{total_sober}</b>"
+    header = (
+        f"📊 Сегодня трезвых: <b>{community.sober}</b>\n"
+        f"🤝 Вместе: <b>{community.days:,}</b> дн. · <b>{community.hours:,}</b> ч · <b>{community.money:,} €</b>"
+    )
     body = (
         f"📅 Дата отказа: <b>{user.quit_date:%d.%m.%Y}</b>\n"
         f"⏳ <b>{human_dhms(days)}</b> трезвости\n\n"
@@ -60,9 +55,7 @@ async def show_stats(user: User, reply):
 # ─── /counter ───────────────────────────────────────────
 @counter_router.message(F.text == "/counter")
 async def cmd_counter(msg: Message, state: FSMContext):
-    uid = msg.from_user.id
-    async with async_session() as ses:
-        user = (await ses.execute(select(User).where(User.telegram_id == uid))).scalar_one_or_none()
+    user = await get_user(msg.from_user.id)
 
     if not user:
         return await msg.answer("❌ Профиль не найден. Напиши /start.")
@@ -90,6 +83,7 @@ async def save_date(msg: Message, state: FSMContext):
         user.quit_date = qd
         user.is_sober = True
         user.last_checkpoint = 0
+        user.sync_next_milestone()
         await ses.commit()
 
     await state.clear()
@@ -119,6 +113,7 @@ async def relapse_reset(cb: CallbackQuery):
             user.quit_date = today
             user.is_sober = True
             user.last_checkpoint = 0
+            user.sync_next_milestone()
             await ses.commit()
     await cb.message.edit_text("🔄 Счётчик обнулён. Встаём и идём дальше!")
 
@@ -9,14 +9,14 @@ from aiogram.types import (
 )
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select, func
 from datetime import date
 
 from config import SUPER_GROUP, TOPICS, MENTORS, TRIBUTE_URL_TEMPLATE
 from database.database import async_session
 from database.user import User
 from database.post import Post
-from database.post_like import PostLike
+from database.utils import get_user, add_like, remove_like, get_likes_count
+from services.edit_coalescer import markup_coalescer
 
 main_router = Router()
 
@@ -84,25 +84,21 @@ async def ensure_member_active(user: User | None, reply_fn) -> bool:
 # ═════════════  /win et /sos  ═════════════
 @main_router.message(F.text == "/win")
 async def cmd_win(msg: Message, state: FSMContext):
-    async with async_session() as ses:
-        user = await ses.scalar(select(User)
-                                .where(User.telegram_id == msg.from_user.id))
-        if not await ensure_profile_complete(user, msg.answer):
-            return
-        if not await ensure_member_active(user, msg.answer):
-            return
+    user = await get_user(msg.from_user.id)
+    if not await ensure_profile_complete(user, msg.answer):
+        return
+    if not await ensure_member_active(user, msg.answer):
+        return
     await msg.answer("🎉 Расскажи о своей победе (до 500 символов):")
     await state.set_state(WinState.waiting_for_text)
 
 @main_router.message(F.text == "/sos")
 async def cmd_sos(msg: Message, state: FSMContext):
-    async with async_session() as ses:
-        user = await ses.scalar(select(User)
-                                .where(User.telegram_id == msg.from_user.id))
-        if not await ensure_profile_complete(user, msg.answer):
-            return
-        if not await ensure_member_active(user, msg.answer):
-            return
+    user = await get_user(msg.from_user.id)
+    if not await ensure_profile_complete(user, msg.answer):
+        return
+    if not await ensure_member_active(user, msg.answer):
+        return
     await msg.answer("🆘 Что случилось? Опиши ситуацию (до 500 символов):")
     await state.set_state(SosState.waiting_for_text)
 
@@ -122,29 +118,30 @@ async def handle_sos(msg: Message, state: FSMContext):
         return
     text = msg.text.strip()[:500]
 
-    async with async_session() as ses:
-        user: User = await ses.scalar(select(User)
-                                      .where(User.telegram_id == msg.from_user.id))
-        if not await ensure_profile_complete(user, msg.answer):
-            return
-        if not await ensure_member_active(user, msg.answer):
-            return
-
-        sobriety = format_sobriety_duration(user.quit_date)
-        body = (
-            f"{text}\n\n"
-            f"—\n{user.avatar_emoji} {user.pseudo} | {sobriety} | 0 ответов"
-        )
+    user = await get_user(msg.from_user.id)
+    if not await ensure_profile_complete(user, msg.answer):
+        return
+    if not await ensure_member_active(user, msg.answer):
+        return
 
-        sent = await msg.bot.send_message(
-            SUPER_GROUP, message_thread_id=TOPICS["sos"], text=body
-        )
-        await sent.edit_reply_markup(
-            reply_markup=post_inline_keyboard(
-                message_id=sent.message_id,
-                with_reply=True, with_like=True, with_support=True, likes=0
-            )
+    sobriety = format_sobriety_duration(user.quit_date)
+    body = (
+        f"{text}\n\n"
+        f"—\n{user.avatar_emoji} {user.pseudo} | {sobriety} | 0 ответов"
+    )
+
+    sent = await msg.bot.send_message(
+        SUPER_GROUP, message_thread_id=TOPICS["sos"], text=body
+    )
+    await sent.edit_reply_markup(
+        reply_markup=post_inline_keyboard(
+            message_id=sent.message_id,
+            with_reply=True, with_like=True, with_support=True, likes=0
         )
+    )
+
+    # session d'écriture ouverte seulement pour l'INSERT (pas pendant les appels Telegram)
+    async with async_session() as ses:
         ses.add(Post(id=sent.message_id, author_id=user.id,
                      thread_id=TOPICS["sos"], text=text))
         await ses.commit()
@@ -159,30 +156,29 @@ async def handle_win(msg: Message, state: FSMContext):
         return
     text = msg.text.strip()[:500]
 
-    async with async_session() as ses:
-        user: User = await ses.scalar(select(User)
-                                      .where(User.telegram_id == msg.from_user.id))
-        if not await ensure_profile_complete(user, msg.answer):
-            return
-        if not await ensure_member_active(user, msg.answer):
-            return
-
-        sobriety = format_sobriety_duration(user.quit_date)
-        body = (
-            f"{text}\n\n"
-            f"—\n{user.avatar_emoji} {user.pseudo} | {sobriety} | 0 ответов"
-        )
+    user = await get_user(msg.from_user.id)
+    if not await ensure_profile_complete(user, msg.answer):
+        return
+    if not await ensure_member_active(user, msg.answer):
+        return
 
-        sent = await msg.bot.send_message(
-            SUPER_GROUP, message_thread_id=TOPICS["wins"], text=body
-        )
-        await sent.edit_reply_markup(
-            reply_markup=post_inline_keyboard(
-                message_id=sent.message_id,
-                with_reply=True, with_like=True, with_support=False, likes=0
-            )
+    sobriety = format_sobriety_duration(user.quit_date)
+    body = (
+        f"{text}\n\n"
+        f"—\n{user.avatar_emoji} {user.pseudo} | {sobriety} | 0 ответов"
+    )
+
+    sent = await msg.bot.send_message(
+        SUPER_GROUP, message_thread_id=TOPICS["wins"], text=body
+    )
+    await sent.edit_reply_markup(
+        reply_markup=post_inline_keyboard(
+            message_id=sent.message_id,
+            with_reply=True, with_like=True, with_support=False, likes=0
         )
+    )
 
+    async with async_session() as ses:
         ses.add(Post(id=sent.message_id, author_id=user.id,
                      thread_id=TOPICS["wins"], text=text))
         await ses.commit()
@@ -195,40 +191,30 @@ async def handle_win(msg: Message, state: FSMContext):
 async def like_post(cb: CallbackQuery):
     post_id = int(cb.data.split(":", 1)[1])
 
-    async with async_session() as ses:
-        # déjà liké ?
-        exists = await ses.scalar(select(PostLike)
-                                  .where(PostLike.post_id == post_id,
-                                         PostLike.user_id == cb.from_user.id))
-        if exists:
-            return await cb.answer("Уже лайкнул 😉", show_alert=True)
-
-        ses.add(PostLike(post_id=post_id, user_id=cb.from_user.id))
-        await ses.commit()
-
-        likes = await ses.scalar(
-            select(func.count()).select_from(PostLike)
-                  .where(PostLike.post_id == post_id)
-        )
+    # 2e tap = unlike
+    liked = await add_like(post_id, cb.from_user.id) is not None
+    if not liked:
+        await remove_like(post_id, cb.from_user.id)
 
     # boutons selon le topic
     thread = cb.message.message_thread_id
     with_support = thread == TOPICS["sos"]
     with_reply   = with_support or thread == TOPICS["wins"]
 
-    try:
-        await cb.message.edit_reply_markup(
-            reply_markup=post_inline_keyboard(
-                message_id=post_id,
-                with_reply=with_reply,
-                with_like=True,
-                with_support=with_support,
-                likes=likes
-            )
+    # compteur relu à l'envoi : les taps concurrents (like / unlike) finissent
+    # dans n'importe quel ordre, seul l'état en base au moment de l'édition compte
+    async def render() -> InlineKeyboardMarkup:
+        return post_inline_keyboard(
+            message_id=post_id,
+            with_reply=with_reply,
+            with_like=True,
+            with_support=with_support,
+            likes=await get_likes_count(post_id)
         )
-    except Exception:
-        pass
-    await cb.answer("❤️")
+
+    # édition différée et regroupée : une seule édition par fenêtre vers Telegram
+    markup_coalescer.schedule(cb.bot, cb.message.chat.id, cb.message.message_id, render)
+    await cb.answer("❤️" if liked else "💔 Лайк убран")
 
 # ═════════════  Bouton « 🤝 Поддержать »  ═════════════
 @main_router.callback_query(F.data.startswith("support:"))
@@ -172,6 +172,7 @@ async def complete_registration(telegram_id: int, state: FSMContext, reply_fn):
         user.pseudo       = data["pseudo"]
         user.avatar_emoji = data["avatar_emoji"]
         user.quit_date    = data.get("quit_date")
+        user.sync_next_milestone()
         await ses.commit()
 
     await reply_fn("✅ Профиль создан!")
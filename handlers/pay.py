@@ -4,12 +4,11 @@ from __future__ import annotations
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-from sqlalchemy import select
 from datetime import datetime, timedelta
 
 from config import TRIBUTE_URL_TEMPLATE
-from database.database import async_session
 from database.user import User
+from database.utils import get_user
 
 pay_router = Router()
 
@@ -34,13 +33,11 @@ def pay_text(user: User | None) -> str:
 
 @pay_router.callback_query(F.data == "pay")
 async def open_pay_cb(cb: CallbackQuery):
-    async with async_session() as ses:
-        user = await ses.scalar(select(User).where(User.telegram_id == cb.from_user.id))
+    user = await get_user(cb.from_user.id)
     await cb.message.answer(pay_text(user), reply_markup=PAY_KB)
     await cb.answer()
 
 @pay_router.message(Command("pay"))
 async def open_pay_cmd(msg: Message):
-    async with async_session() as ses:
-        user = await ses.scalar(select(User).where(User.telegram_id == msg.from_user.id))
+    user = await get_user(msg.from_user.id)
     await msg.answer(pay_text(user), reply_markup=PAY_KB)
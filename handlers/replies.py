@@ -5,14 +5,12 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.base import StorageKey
 from aiogram.filters import StateFilter
 from aiogram.exceptions import TelegramForbiddenError
-from sqlalchemy import select, func
-import logging
+import asyncio, logging
 
 from config import SUPER_GROUP, BOT_USERNAME, TOPICS, TRIBUTE_URL_TEMPLATE
-from database.database import async_session
 from database.user import User
 from database.post import Post
-from database.post_like import PostLike
+from database.utils import get_user, get_post_by_id, get_post_with_author, add_reply
 from handlers.main import format_sobriety_duration, post_inline_keyboard
 
 replies_router = Router()
@@ -57,16 +55,15 @@ async def open_reply(cb: CallbackQuery, state: FSMContext):
     post_id = int(cb.data.split(":", 1)[1])
     logging.info(f"[CALLBACK] reply:{post_id} from {cb.from_user.id}")
 
-    async with async_session() as ses:
-        post = await ses.get(Post, post_id)
-        if not post:
-            return await cb.answer("❌ Пост не найден", show_alert=True)
+    post = await get_post_by_id(post_id)
+    if not post:
+        return await cb.answer("❌ Пост не найден", show_alert=True)
 
-        user = await ses.scalar(select(User).where(User.telegram_id == cb.from_user.id))
-        if not await profile_ok(user, cb.bot, cb.from_user.id):
-            return await cb.answer("ℹ️ Я написал тебе в личку.", show_alert=True)
-        if not await membership_ok(user, cb.bot, cb.from_user.id):
-            return await cb.answer("ℹ️ Я написал тебе в личку.", show_alert=True)
+    user = await get_user(cb.from_user.id)
+    if not await profile_ok(user, cb.bot, cb.from_user.id):
+        return await cb.answer("ℹ️ Я написал тебе в личку.", show_alert=True)
+    if not await membership_ok(user, cb.bot, cb.from_user.id):
+        return await cb.answer("ℹ️ Я написал тебе в личку.", show_alert=True)
 
     # Popup dans le groupe
     await cb.answer("✍️ Открой бот — там форма ответа.", show_alert=True)
@@ -110,56 +107,61 @@ async def save_reply(msg: Message, state: FSMContext):
     data = await state.get_data()
     original_id: int | None = data.get("reply_to")
 
-    async with async_session() as ses:
-        post = await ses.get(Post, original_id)
-        if not post:
-            await msg.answer("⛔ Пост не найден.")
-            await state.clear()
-            return
-
-        user: User = await ses.scalar(select(User).where(User.telegram_id == msg.from_user.id))
-        if not await profile_ok(user, msg.bot, msg.from_user.id):
-            return
-        if not await membership_ok(user, msg.bot, msg.from_user.id):
-            return
-
-        # 1) Publier la réponse (sans preview)
-        reply_txt = (
-            f"<b>Ответ на пост</b> "
-            f"<a href='{link_to_post(original_id)}'>#{original_id}</a>:\n\n"
-            f"{raw}\n\n"
-            f"—\n{user.avatar_emoji} {user.pseudo}  | "
-            f"{format_sobriety_duration(user.quit_date)}"
-        )
-        sent = await msg.bot.send_message(
-            chat_id=SUPER_GROUP,
-            message_thread_id=post.thread_id,
-            reply_to_message_id=original_id,
-            text=reply_txt,
-            parse_mode="HTML",
-            link_preview_options=LinkPreviewOptions(is_disabled=True)
-        )
-        logging.info(f"✅ Réponse publiée ID {sent.message_id}")
-
-        # 2) Mettre à jour le post original (texte + boutons)
-        post.reply_count += 1
-        author = await ses.get(User, post.author_id)
-
-        n = post.reply_count
-        replies_label = f"✅ {n} ответ" if n == 1 else f"✅ {n} ответа" if 2 <= n <= 4 else f"✅ {n} ответов"
-
-        updated = (
-            f"{post.text}\n\n"
-            f"—\n{author.avatar_emoji} {author.pseudo}  | "
-            f"{format_sobriety_duration(author.quit_date)}  | {replies_label}"
-        )
-
-        likes = await ses.scalar(
-            select(func.count()).select_from(PostLike).where(PostLike.post_id == original_id)
-        )
-        with_support = post.thread_id == TOPICS["sos"]
-
-        await msg.bot.edit_message_text(
+    # post + auteur (une requête) et user courant (cache) en parallèle
+    loaded, user = await asyncio.gather(get_post_with_author(original_id), get_user(msg.from_user.id))
+    if not loaded:
+        await msg.answer("⛔ Пост не найден.")
+        await state.clear()
+        return
+    post, author = loaded
+
+    if not await profile_ok(user, msg.bot, msg.from_user.id):
+        return
+    if not await membership_ok(user, msg.bot, msg.from_user.id):
+        return
+
+    # 1) Publier la réponse (sans preview)
+    reply_txt = (
+        f"<b>Ответ на пост</b> "
+        f"<a href='{link_to_post(original_id)}'>#{original_id}</a>:\n\n"
+        f"{raw}\n\n"
+        f"—\n{user.avatar_emoji} {user.pseudo}  | "
+        f"{format_sobriety_duration(user.quit_date)}"
+    )
+    sent = await msg.bot.send_message(
+        chat_id=SUPER_GROUP,
+        message_thread_id=post.thread_id,
+        reply_to_message_id=original_id,
+        text=reply_txt,
+        parse_mode="HTML",
+        link_preview_options=LinkPreviewOptions(is_disabled=True)
+    )
+    logging.info(f"✅ Réponse publiée ID {sent.message_id}")
+
+    # 2) Persister la réponse : reply_count incrémenté atomiquement (UPDATE … RETURNING)
+    counts = await add_reply(post.id, Post(
+        id=sent.message_id,
+        author_id=user.id,
+        thread_id=post.thread_id,
+        parent_id=post.id,
+        text=raw
+    ))
+    n = counts.reply_count if counts and counts.reply_count is not None else (post.reply_count or 0) + 1
+    likes = counts.likes_count if counts else post.likes_count
+
+    # 3) Mettre à jour le post original (texte + boutons) et confirmer en DM, en parallèle
+    replies_label = f"✅ {n} ответ" if n == 1 else f"✅ {n} ответа" if 2 <= n <= 4 else f"✅ {n} ответов"
+
+    updated = (
+        f"{post.text}\n\n"
+        f"—\n{author.avatar_emoji} {author.pseudo}  | "
+        f"{format_sobriety_duration(author.quit_date)}  | {replies_label}"
+    )
+
+    with_support = post.thread_id == TOPICS["sos"]
+
+    await asyncio.gather(
+        msg.bot.edit_message_text(
             chat_id=SUPER_GROUP,
             message_id=original_id,
             text=updated,
@@ -170,19 +172,10 @@ async def save_reply(msg: Message, state: FSMContext):
                 with_support=with_support,
                 likes=likes or 0
             )
-        )
-
-        # 3) Persister la réponse
-        ses.add(Post(
-            id=sent.message_id,
-            author_id=user.id,
-            thread_id=post.thread_id,
-            parent_id=post.id,
-            text=raw
-        ))
-        await ses.commit()
-
-    await msg.answer("✅ Ответ опубликован!")
+        ),
+        # méthode aiogram = modèle pydantic non hashable : gather() l'indexe dans un dict, d'où le future
+        asyncio.ensure_future(msg.answer("✅ Ответ опубликован!")),
+    )
     await state.clear()
     logging.info(f"[FSM] cleared for {msg.from_user.id}")
 
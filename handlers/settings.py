@@ -1,11 +1,11 @@
 # handlers/settings.py
 """
-Команда /settings : изменить псевдоним, эмодзи, дату отказа и включить/выключить уведомления.
+Команда /settings : изменить псевдоним, эмодзи, дату отказа, часовой пояс и включить/выключить уведомления.
 (aiogram v3 ➜ InlineKeyboardButton exige des arguments nommés.)
 """
 
 import re
-from datetime import date
+from datetime import date, datetime, timedelta, timezone
 
 from aiogram import Router, F
 from aiogram.filters import Command
@@ -18,6 +18,8 @@ from aiogram.types import (
     InlineKeyboardButton,
 )
 
+from config import TRIBUTE_URL_TEMPLATE
+from database.user import UTC_OFFSETS
 from database.utils import get_user, update_user
 
 # ──────────────────────── Init ────────────────────────
@@ -38,6 +40,9 @@ def _fmt_date(dt):
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(timezone.utc).strftime("%d.%m.%Y")
 
+def _fmt_offset(offset: int) -> str:
+    return f"UTC{offset:+d}"
+
 # ───────────────────────── /settings ─────────────────────────
 @settings_router.message(Command("settings"))
 async def settings_handler(message: Message):
@@ -53,17 +58,22 @@ async def settings_handler(message: Message):
         f"• Псевдоним: <code>{user.pseudo}</code>",
         f"• Эмодзи: {user.avatar_emoji}",
         f"• Дата отказа: {user.quit_date or '—'}",
+        f"• Часовой пояс: {_fmt_offset(user.utc_offset)}",
         f"• Уведомления: {'Вкл' if notif_enabled else 'Выкл'}",
     ]
 
     # abonnement
     now = datetime.utcnow().replace(tzinfo=timezone.utc)
     show_extend_btn = False
-    if getattr(user, "paid_until", None):
-        lines.append(f"• 💳 Абонемент активен до: <b>{_fmt_date(user.paid_until)}</b>")
-        days_left = (user.paid_until - now).days
+    paid_until = getattr(user, "paid_until", None)
+    if paid_until:
+        # paid_until est stocké naïf (UTC) : on l'aligne sur `now` avant de comparer
+        if paid_until.tzinfo is None:
+            paid_until = paid_until.replace(tzinfo=timezone.utc)
+        lines.append(f"• 💳 Абонемент активен до: <b>{_fmt_date(paid_until)}</b>")
+        days_left = (paid_until - now).days
         # bouton si expiré ou <= 3 jours
-        if user.paid_until <= now or days_left <= 3:
+        if paid_until <= now or days_left <= 3:
             show_extend_btn = True
     else:
         lines.append("• 💳 Абонемент: <b>не активен</b>")
@@ -76,6 +86,7 @@ async def settings_handler(message: Message):
         [InlineKeyboardButton(text="✏️ Псевдоним",   callback_data="edit_pseudo")],
         [InlineKeyboardButton(text="🙂 Эмодзи",      callback_data="edit_emoji")],
         [InlineKeyboardButton(text="📅 Дата отказа", callback_data="edit_quit_date")],
+        [InlineKeyboardButton(text="🕒 Часовой пояс", callback_data="edit_tz")],
         [InlineKeyboardButton(text="🔔 Вкл / Выкл",  callback_data="toggle_notifs")],
     ]
     if show_extend_btn:
@@ -137,6 +148,34 @@ async def save_date(msg: Message, state: FSMContext):
         await msg.answer("✅ Дата обновлена.")
     await state.clear()
 
+# ──────────────────────── Часовой пояс ────────────────────────
+# l'user choisit l'heure qu'il voit sur sa montre : pas besoin de connaître son UTC
+@settings_router.callback_query(F.data == "edit_tz")
+async def choose_tz(cb: CallbackQuery):
+    now = datetime.utcnow()
+    buttons = [
+        InlineKeyboardButton(text=f"{now + timedelta(hours=o):%H:%M} ({_fmt_offset(o)})",
+                             callback_data=f"set_tz:{o}")
+        for o in UTC_OFFSETS
+    ]
+    rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    await cb.message.edit_text("🕒 Который у вас сейчас час?",
+                               reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    await cb.answer()
+
+@settings_router.callback_query(F.data.startswith("set_tz:"))
+async def save_tz(cb: CallbackQuery):
+    try:
+        offset = int(cb.data.split(":", 1)[1])
+    except ValueError:
+        return await cb.answer()
+    if offset not in UTC_OFFSETS:
+        return await cb.answer()
+    await update_user(cb.from_user.id, utc_offset=offset)
+    await cb.message.edit_text(f"✅ Часовой пояс: {_fmt_offset(offset)}. "
+                               "Уведомления будут приходить по вашему времени.")
+    await cb.answer()
+
 # ──────────────────────── Уведомления ────────────────────────
 @settings_router.callback_query(F.data == "toggle_notifs")
 async def toggle_notifs(cb: CallbackQuery):
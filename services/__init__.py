@@ -0,0 +1,3 @@
+from .broadcast import Broadcaster, TokenBucket, BroadcastStats
+
+__all__ = ["Broadcaster", "TokenBucket", "BroadcastStats"]
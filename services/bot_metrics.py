@@ -0,0 +1,215 @@
+# services/bot_metrics.py
+"""Métriques du bot, exportées en texte Prometheus sur la route /metrics.
+
+• updates par type (middleware outer du Dispatcher), avec trace par update :
+  latence glissante par handler et log des updates lents (services/tracing.py) ;
+• handlers par router (middleware inner du Dispatcher, hérité par les sous-routers) ;
+• crons : durée, statut et lignes traitées (`track_job`) ;
+• jauges lues au moment du rendu : pool DB, stockage FSM, caches, éditions de clavier.
+
+Les appels Bot API (services/telegram_session.py) et les webhooks Tribute
+(services/tribute.py) déclarent leurs propres métriques dans le même REGISTRY.
+"""
+from __future__ import annotations
+
+import functools, logging, time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher, Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+
+from config import METRICS_TOKEN, SLOW_UPDATE_MS
+from database.database import engine, read_engine
+from database.utils import cache_stats
+from services.broadcast import BroadcastStats
+from services.edit_coalescer import markup_coalescer
+from services.metrics import Counter, Gauge, Histogram, render
+from services.tracing import UpdateTrace, current_trace, latency_summary, record_latency
+
+UPDATES = Counter(
+    "bot_updates_total", "Updates traités par le Dispatcher", ("type", "status"),
+)
+UPDATE_SECONDS = Histogram(
+    "bot_update_seconds", "Durée de traitement d'un update (middlewares compris)", ("type",),
+)
+HANDLER_CALLS = Counter(
+    "bot_handler_calls_total", "Appels de handlers", ("router", "handler", "status"),
+)
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Durée des handlers", ("router", "handler"),
+)
+HANDLER_SQL = Counter(
+    "bot_handler_sql_statements_total", "Requêtes SQL exécutées par update, par handler", ("handler",),
+)
+HANDLER_SQL_SECONDS = Counter(
+    "bot_handler_sql_seconds_total", "Temps SQL cumulé par handler", ("handler",),
+)
+CRON_RUNS = Counter(
+    "bot_cron_runs_total", "Exécutions des crons", ("job", "status"),
+)
+CRON_SECONDS = Histogram(
+    "bot_cron_seconds", "Durée des crons", ("job",),
+    buckets=(1, 5, 15, 60, 300, 900, 1800, 3600, 7200),
+)
+CRON_ROWS = Counter(
+    "bot_cron_rows_total", "Lignes (users) traitées par les crons", ("job",),
+)
+
+
+# ───────────────────────────────  Dispatcher  ─────────────────────────────
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer middleware sur `dp.update` : un échantillon par update reçu."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        kind = event.event_type
+        status = "handled"
+        trace = UpdateTrace(event.update_id, kind)
+        token = current_trace.set(trace)
+        try:
+            result = await handler(event, data)
+            if result is UNHANDLED:
+                status = "unhandled"
+            return result
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            current_trace.reset(token)
+            elapsed = trace.elapsed
+            UPDATES.labels(kind, status).inc()
+            UPDATE_SECONDS.labels(kind).observe(elapsed)
+            record_latency(trace.handler, elapsed)
+            HANDLER_SQL.labels(trace.handler).inc(trace.db_queries)
+            HANDLER_SQL_SECONDS.labels(trace.handler).inc(trace.db_time)
+            if elapsed * 1000 >= SLOW_UPDATE_MS:
+                logging.warning("Update lent #%s (%s) %s : %s",
+                                trace.update_id, kind, trace.handler, trace.breakdown())
+            trace.report_repeated(trace.handler)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware : appelé seulement quand un handler a matché (router = `event_router`)."""
+
+    def __init__(self, names: dict[int, str]):
+        self.names = names      # id(router) -> nom affiché
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        router = self.names.get(id(data.get("event_router")), "dp")
+        name = data["handler"].callback.__name__
+        trace = current_trace.get()
+        if trace is not None:
+            trace.handler = f"{router}.{name}"
+        status = "ok"
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            HANDLER_CALLS.labels(router, name, status).inc()
+            HANDLER_SECONDS.labels(router, name).observe(time.perf_counter() - t0)
+
+
+def instrument(dp: Dispatcher, routers: dict[str, Router]) -> None:
+    """Pose les middlewares de métriques ; `routers` = {"main_router": main_router, …}."""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    mw = HandlerMetricsMiddleware({id(r): name for name, r in routers.items()})
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(mw)
+
+    storage = dp.storage
+    Gauge(
+        "bot_fsm_keys", "Clés FSM en mémoire (cache du stockage)",
+        callback=lambda: [((), len(storage))] if hasattr(storage, "__len__") else [],
+    )
+
+
+# ───────────────────────────────  Crons  ──────────────────────────────────
+def track_job(job: str):
+    """Décorateur des jobs cron ; s'ils retournent leurs BroadcastStats, compte les lignes."""
+    def decorator(fn: Callable[..., Awaitable[Any]]):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            status = "ok"
+            # même trace que pour un update : les workers du Broadcaster héritent du contexte
+            trace = UpdateTrace(0, "cron", handler=f"cron.{job}")
+            token = current_trace.set(trace)
+            try:
+                result = await fn(*args, **kwargs)
+                if isinstance(result, BroadcastStats):
+                    CRON_ROWS.labels(job).inc(result.total)
+                return result
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                current_trace.reset(token)
+                CRON_RUNS.labels(job, status).inc()
+                CRON_SECONDS.labels(job).observe(trace.elapsed)
+                logging.info("Cron %s : %s", job, trace.breakdown())
+                # les lots (keyset) répètent la même requête : normal, on ne fait que l'afficher
+                trace.report_repeated(trace.handler, logging.INFO)
+        return wrapper
+    return decorator
+
+
+# ───────────────────────────────  Jauges  ─────────────────────────────────
+def _db_pool_samples():
+    engines = {"write": engine} if read_engine is engine else {"write": engine, "read": read_engine}
+    for name, eng in engines.items():
+        pool = eng.pool
+        if not hasattr(pool, "checkedout"):      # StaticPool / NullPool : rien à mesurer
+            continue
+        yield (name, "checked_out"), pool.checkedout()
+        yield (name, "idle"), pool.checkedin()
+        yield (name, "overflow"), max(pool.overflow(), 0)
+        yield (name, "size"), pool.size()
+
+
+def _cache_samples(field: str):
+    return [((name,), stats[field]) for name, stats in cache_stats().items()]
+
+
+Gauge("bot_db_pool_connections", "Connexions du pool SQLAlchemy", ("engine", "state"),
+      callback=_db_pool_samples)
+Gauge("bot_cache_entries", "Entrées des caches mémoire", ("cache",),
+      callback=lambda: _cache_samples("size"))
+Counter("bot_cache_hits_total", "Lectures servies par le cache", ("cache",),
+        callback=lambda: _cache_samples("hits"))
+Counter("bot_cache_misses_total", "Lectures allées en base", ("cache",),
+        callback=lambda: _cache_samples("misses"))
+Counter("bot_cache_evictions_total", "Évictions LRU", ("cache",),
+        callback=lambda: _cache_samples("evictions"))
+Counter("bot_markup_edits_total", "Éditions de clavier (likes) par issue", ("result",),
+        callback=lambda: [((k,), v) for k, v in markup_coalescer.stats().items() if k != "pending"])
+Gauge("bot_handler_latency_seconds", "Latence des updates par handler (fenêtre glissante)",
+      ("handler", "quantile"),
+      callback=lambda: [((r["handler"], q), r[k]) for r in latency_summary()
+                        for q, k in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99"))],
+      aggregate=False)      # latency_summary() fusionne déjà les fenêtres des workers
+Gauge("bot_markup_edits_pending", "Éditions de clavier en attente d'envoi",
+      callback=lambda: [((), markup_coalescer.stats()["pending"])])
+
+
+# ───────────────────────────────  Route  ──────────────────────────────────
+async def metrics_handler(request: web.Request) -> web.Response:
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return web.Response(status=401)
+    return web.Response(
+        body=render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
@@ -0,0 +1,184 @@
+# services/broadcast.py
+"""Moteur d'envoi en masse pour les crons (DM, posts auto, exclusions).
+
+• Concurrence bornée (N workers) pour qu'un appel lent ne bloque pas les autres.
+• Token bucket global partagé par tous les envois : ~30 msg/s côté Telegram.
+• Envois dans un groupe (`call_in_chat`) : en plus, un bucket par chat
+  (~20 msg/min côté Telegram), sans quoi les posts avancent à coups de 429.
+• `TelegramRetryAfter` respecté : le bucket concerné est mis en pause (celui du
+  groupe pour un envoi dans un groupe : les DM continuent).
+• Compteurs de progression / débit loggés pendant l'envoi.
+"""
+from __future__ import annotations
+
+import asyncio, logging, time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, GROUP_RATE_PER_MIN
+
+T = TypeVar("T")
+
+MAX_RETRIES = 3          # tentatives max sur flood control pour un même appel
+PROGRESS_EVERY = 500     # log de progression tous les N éléments
+
+
+# ───────────────────────────────  Rate limit  ──────────────────────────────
+class TokenBucket:
+    """Token bucket asyncio : `rate` jetons/s, rafale max `capacity`."""
+
+    def __init__(self, rate: float, capacity: int | None = None):
+        self.rate = float(rate)
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Gèle le bucket (flood control Telegram) et vide les jetons."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+# Un seul bucket pour tout le process : les jobs qui tournent en même temps se partagent la limite
+GLOBAL_BUCKET = TokenBucket(BROADCAST_RATE)
+
+# Un bucket par groupe, lui aussi partagé par les jobs du process
+CHAT_BUCKETS: dict[int, TokenBucket] = {}
+
+
+def chat_bucket(chat_id: int) -> TokenBucket:
+    bucket = CHAT_BUCKETS.get(chat_id)
+    if bucket is None:
+        bucket = CHAT_BUCKETS[chat_id] = TokenBucket(GROUP_RATE_PER_MIN / 60)
+    return bucket
+
+
+# ───────────────────────────────  Stats  ──────────────────────────────────
+@dataclass
+class BroadcastStats:
+    name: str
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    api_calls: int = 0
+    retried: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Appels API par seconde depuis le début."""
+        return self.api_calls / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"broadcast {self.name}: {self.done + self.failed}/{self.total} traités, "
+                f"{self.failed} échecs, {self.api_calls} appels, {self.retried} retry, "
+                f"{self.throughput:.1f} msg/s, {self.elapsed:.1f}s")
+
+
+# ───────────────────────────────  Engine  ─────────────────────────────────
+class Broadcaster:
+    """
+    Exécute `handler(item)` pour chaque élément avec au plus `concurrency` en vol.
+    Dans le handler, chaque appel Bot API passe par `await bc.call(bot.send_message, ...)`
+    pour consommer un jeton et rejouer après un flood control.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        bucket: TokenBucket | None = None,
+    ):
+        self.concurrency = concurrency
+        self.bucket = bucket or GLOBAL_BUCKET
+        self.stats = BroadcastStats(name)
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        return await self.call_lazy(lambda: fn(*args, **kwargs))
+
+    async def call_in_chat(self, chat_id: int, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Comme `call`, pour un message envoyé dans le groupe `chat_id` : jeton du groupe puis
+        jeton global ; un flood control ne gèle que le bucket du groupe."""
+        return await self._call(lambda: fn(*args, **kwargs), chat_bucket(chat_id))
+
+    async def call_lazy(self, make: Callable[[], Awaitable[T]]) -> T:
+        """Comme `call`, mais l'appel est reconstruit à chaque tentative, une fois le jeton obtenu :
+        pour les arguments relatifs à l'heure d'envoi (`until_date=now + …`)."""
+        return await self._call(make)
+
+    async def _call(self, make: Callable[[], Awaitable[T]], chat: TokenBucket | None = None) -> T:
+        for attempt in range(MAX_RETRIES + 1):
+            if chat is not None:
+                await chat.acquire()            # d'abord le groupe : pas de jeton global gardé en attente
+            await self.bucket.acquire()
+            self.stats.api_calls += 1
+            try:
+                return await make()
+            except TelegramRetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                self.stats.retried += 1
+                logging.warning("%s: flood control, pause %ss", self.stats.name, e.retry_after)
+                (chat if chat is not None else self.bucket).pause(e.retry_after)
+        raise AssertionError("unreachable")
+
+    async def run(
+        self,
+        items: Iterable[T],
+        handler: Callable[[T], Awaitable[Any]],
+    ) -> BroadcastStats:
+        """Peut être appelé plusieurs fois (ex. une fois par lot) : les stats s'additionnent."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        stats = self.stats
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                try:
+                    await handler(item)
+                    stats.done += 1
+                except Exception as e:
+                    stats.failed += 1
+                    logging.warning("%s: échec pour %r: %s", stats.name, item, e)
+                finally:
+                    queue.task_done()
+                    if (stats.done + stats.failed) % PROGRESS_EVERY == 0:
+                        logging.info("%s", stats)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for item in items:
+                stats.total += 1
+                await queue.put(item)
+            await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return stats
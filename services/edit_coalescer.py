@@ -0,0 +1,98 @@
+# services/edit_coalescer.py
+"""Regroupe les mises à jour de clavier inline (compteur ❤️) par message.
+
+Un post viral reçoit des dizaines de taps par seconde : au lieu d'un
+`edit_message_reply_markup` par tap (bridé par Telegram), les demandes d'une
+fenêtre de `window` secondes donnent une seule édition. Le clavier est construit
+au moment de l'envoi (`render`), pas à la demande : il reflète l'état le plus
+récent même si les taps ont fini dans le désordre ; une demande arrivée pendant
+l'envoi en déclenche un autre. Les éditions identiques au dernier clavier envoyé
+sont ignorées.
+"""
+from __future__ import annotations
+
+import asyncio, logging
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from config import EDIT_COALESCE_WINDOW
+
+Key = tuple[int, int]   # (chat_id, message_id)
+Render = Callable[[], Awaitable[InlineKeyboardMarkup]]
+
+
+class MarkupCoalescer:
+    def __init__(self, window: float = EDIT_COALESCE_WINDOW, memory: int = 5000):
+        self.window = window
+        self.memory = memory
+        self._pending: dict[Key, tuple[Bot, Render]] = {}
+        self._tasks: dict[Key, asyncio.Task] = {}
+        self._last_sent: OrderedDict[Key, InlineKeyboardMarkup] = OrderedDict()
+        self.scheduled = self.coalesced = self.skipped = self.sent = self.failed = 0
+
+    def schedule(self, bot: Bot, chat_id: int, message_id: int, render: Render) -> None:
+        """Demande une mise à jour du clavier ; `render()` le construit juste avant l'envoi."""
+        key = (chat_id, message_id)
+        self.scheduled += 1
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = (bot, render)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush(key))
+
+    def _remember(self, key: Key, markup: InlineKeyboardMarkup) -> None:
+        self._last_sent[key] = markup
+        self._last_sent.move_to_end(key)
+        while len(self._last_sent) > self.memory:
+            self._last_sent.popitem(last=False)
+
+    async def _flush(self, key: Key) -> None:
+        chat_id, message_id = key
+        try:
+            while True:
+                await asyncio.sleep(self.window)
+                if key not in self._pending:
+                    return
+                bot, render = self._pending.pop(key)
+                try:
+                    markup = await render()
+                except Exception as e:
+                    self.failed += 1
+                    logging.debug("Render markup fail %s: %s", key, e)
+                    continue
+                if self._last_sent.get(key) == markup:
+                    self.skipped += 1
+                    continue
+                try:
+                    await bot.edit_message_reply_markup(
+                        chat_id=chat_id, message_id=message_id, reply_markup=markup
+                    )
+                    self.sent += 1
+                    self._remember(key, markup)
+                except TelegramRetryAfter as e:
+                    # on garde la version la plus récente et on réessaie après la pause
+                    self._pending.setdefault(key, (bot, render))
+                    await asyncio.sleep(e.retry_after)
+                except TelegramBadRequest as e:
+                    if "not modified" in str(e):
+                        self._remember(key, markup)
+                    else:
+                        self.failed += 1
+                        logging.debug("Edit markup fail %s: %s", key, e)
+                except Exception as e:
+                    self.failed += 1
+                    logging.debug("Edit markup fail %s: %s", key, e)
+        finally:
+            self._tasks.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        return {"scheduled": self.scheduled, "coalesced": self.coalesced,
+                "skipped": self.skipped, "sent": self.sent, "failed": self.failed,
+                "pending": len(self._pending)}
+
+
+markup_coalescer = MarkupCoalescer()
@@ -0,0 +1,344 @@
+# services/jobs.py
+"""Crons : une seule déclaration par job, un enregistrement `job_runs` par exécution.
+
+    jobs = JobScheduler()
+
+    @jobs.job("motivation", "0 * * * *")
+    async def motivation_notifs_job(run: JobRunHandle):
+        async for rows in iter_user_chunks(User.telegram_id, after_id=run.cursor):
+            await bc.run(rows, notify)
+            await run.advance(rows[-1].id, bc.stats)
+
+• `jobs.start()` (dans main(), event loop lancé) pose les crontabs en UTC.
+• Verrou : au plus un run "running" par job (index unique partiel sur job_runs) ;
+  un run dont le heartbeat a plus de JOB_LOCK_TTL s est considéré orphelin (crash).
+• Scopes : un job horaire à l'heure locale des users déclare
+  `scopes=lambda now: local_hour_slots(9, now)` ; chaque passage fait un run par
+  fuseau où il est 9 h (`run.scope` = "UTC+3 2026-01-31", voir LocalSlot).
+  Sans `scopes`, un seul run par passage (scope NULL).
+• Reprise : si le dernier run d'un scope n'a pas fini (orphelin, échec, arrêt) et
+  date de moins de `resume_window` h, il repart de son `cursor` (dernier users.id
+  traité, avancé après chaque lot committé) au lieu de tout refaire ; le passage
+  suivant du cron reprend d'abord ces scopes en retard.
+• `/cron_status` lit l'historique (`job_history()`) et le prochain passage (`next_run()`).
+"""
+from __future__ import annotations
+
+import asyncio, functools, logging, os, socket
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Sequence
+
+import aiocron
+from cronsim import CronSim
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from config import JOB_HEARTBEAT, JOB_HISTORY, JOB_LOCK_TTL, JOB_RESUME_WINDOW
+from database.database import async_session
+from database.job_run import JobRun
+from database.user import UTC_OFFSETS
+from services.broadcast import BroadcastStats
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+
+class JobLocked(Exception):
+    """Un run de ce job tourne déjà (ou ce process a perdu son verrou)."""
+
+
+@dataclass
+class JobRunHandle:
+    id: int
+    job: str
+    cursor: int = 0
+    base_processed: int = 0         # compteurs du run avant cette reprise
+    base_failed: int = 0
+    resumed: bool = False
+    scope: str | None = None
+
+    async def advance(self, cursor: int, stats: BroadcastStats | None = None) -> None:
+        """Point de reprise : à appeler APRÈS le commit du lot dont `cursor` est le dernier id."""
+        values: dict[str, Any] = {"cursor": cursor, "heartbeat_at": datetime.utcnow()}
+        if stats is not None:
+            values["processed"] = self.base_processed + stats.done
+            values["failed"] = self.base_failed + stats.failed
+        async with async_session() as ses:
+            res = await ses.execute(
+                update(JobRun).where(JobRun.id == self.id, JobRun.owner == OWNER,
+                                     JobRun.status == "running").values(**values)
+            )
+            await ses.commit()
+        if not res.rowcount:
+            raise JobLocked(f"{self.job}: run #{self.id} repris par un autre process")
+        self.cursor = cursor
+
+
+# ───────────────────────────────  Fuseaux  ────────────────────────────────
+@dataclass(frozen=True)
+class LocalSlot:
+    """Scope d'un run horaire : les users à `offset` h de UTC, pour leur date locale `day`."""
+    offset: int
+    day: date
+
+    def __str__(self) -> str:
+        return f"UTC{self.offset:+d} {self.day.isoformat()}"
+
+    @classmethod
+    def parse(cls, scope: str) -> LocalSlot:
+        tz, day = scope.split()
+        return cls(int(tz.removeprefix("UTC")), date.fromisoformat(day))
+
+
+def local_hour_slots(hour: int, now: datetime | None = None) -> list[str]:
+    """Scopes de l'heure UTC de `now` : un par fuseau où il est `hour` h (1 ou 2)."""
+    now = now or datetime.utcnow()
+    slots = []
+    for offset in UTC_OFFSETS:
+        local = now + timedelta(hours=offset)
+        if local.hour == hour:
+            slots.append(str(LocalSlot(offset, local.date())))
+    return slots
+
+
+def local_day_slots(now: datetime | None = None) -> list[str]:
+    """Un scope par fuseau, pour sa date locale à `now` (lancement manuel : tous les users)."""
+    now = now or datetime.utcnow()
+    return [str(LocalSlot(offset, (now + timedelta(hours=offset)).date())) for offset in UTC_OFFSETS]
+
+
+# ───────────────────────────────  Runs (DB)  ──────────────────────────────
+def _same_scope(scope: str | None):
+    return JobRun.scope.is_(None) if scope is None else JobRun.scope == scope
+
+
+async def begin_run(job: str, scope: str | None = None,
+                    resume_window: float = JOB_RESUME_WINDOW) -> JobRunHandle:
+    """Prend le verrou du job : reprend le dernier run inachevé récent du scope, sinon en crée un."""
+    now = datetime.utcnow()
+    async with async_session() as ses:
+        running = (await ses.scalars(
+            select(JobRun).where(JobRun.job == job, JobRun.status == "running")
+        )).first()
+        if running is not None and running.heartbeat_at >= now - timedelta(seconds=JOB_LOCK_TTL):
+            raise JobLocked(f"{job}: run #{running.id} en cours depuis {running.started_at:%H:%M} UTC")
+
+        last = (await ses.scalars(
+            select(JobRun).where(JobRun.job == job, _same_scope(scope))
+            .order_by(JobRun.id.desc()).limit(1)
+        )).first()
+        resumable = last is not None and last.status != "done" \
+            and last.started_at >= now - timedelta(hours=resume_window)
+
+        # mises à jour conditionnelles (status + heartbeat lus) : un seul process gagne la course
+        def same(r: JobRun):
+            return JobRun.id == r.id, JobRun.status == r.status, JobRun.heartbeat_at == r.heartbeat_at
+
+        if running is not None and not (resumable and running.id == last.id):
+            # orphelin d'un autre scope, ou trop ancien pour être repris : on le clôt
+            res = await ses.execute(update(JobRun).where(*same(running)).values(
+                status="interrupted", finished_at=now, error="orphelin (heartbeat perdu)",
+            ))
+            if not res.rowcount:
+                raise JobLocked(f"{job}: run #{running.id} repris par un autre process")
+
+        if resumable:
+            row = (await ses.execute(
+                update(JobRun).where(*same(last)).values(
+                    status="running", owner=OWNER, heartbeat_at=now, error=None,
+                    finished_at=None, resumes=JobRun.resumes + 1,
+                ).returning(JobRun.cursor, JobRun.processed, JobRun.failed)
+            )).first()
+            if row is None:
+                raise JobLocked(f"{job}: run #{last.id} repris par un autre process")
+            await ses.commit()
+            logging.info("Job %s (%s) : reprise du run #%s après users.id %s",
+                         job, scope or "-", last.id, row.cursor)
+            return JobRunHandle(last.id, job, row.cursor, row.processed, row.failed,
+                                resumed=True, scope=scope)
+
+        run = JobRun(job=job, scope=scope, status="running", owner=OWNER,
+                     started_at=now, heartbeat_at=now)
+        ses.add(run)
+        try:
+            await ses.commit()
+        except IntegrityError:
+            raise JobLocked(f"{job}: un autre process vient de le lancer") from None
+        return JobRunHandle(run.id, job, scope=scope)
+
+
+async def pending_scopes(job: str, resume_window: float = JOB_RESUME_WINDOW) -> list[str | None]:
+    """Scopes dont le dernier run récent n'a pas fini (crash, échec, arrêt), du plus ancien au plus récent."""
+    since = datetime.utcnow() - timedelta(hours=resume_window)
+    async with async_session() as ses:
+        rows = (await ses.execute(
+            select(JobRun.scope, JobRun.status)
+            .where(JobRun.job == job, JobRun.started_at >= since).order_by(JobRun.id)
+        )).all()
+    last = {r.scope: r.status for r in rows}
+    return [scope for scope, status in last.items() if status != "done"]
+
+
+async def finish_run(handle: JobRunHandle, status: str, error: str | None = None) -> None:
+    async with async_session() as ses:
+        await ses.execute(
+            update(JobRun).where(JobRun.id == handle.id, JobRun.owner == OWNER).values(
+                status=status, error=error, finished_at=datetime.utcnow(),
+            )
+        )
+        # historique borné : les JOB_HISTORY derniers runs du job
+        keep = select(JobRun.id).where(JobRun.job == handle.job) \
+            .order_by(JobRun.id.desc()).limit(JOB_HISTORY)
+        await ses.execute(delete(JobRun).where(JobRun.job == handle.job, JobRun.id.not_in(keep)))
+        await ses.commit()
+
+
+async def _heartbeat(handle: JobRunHandle) -> None:
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT)
+        try:
+            async with async_session() as ses:
+                await ses.execute(update(JobRun).where(
+                    JobRun.id == handle.id, JobRun.owner == OWNER, JobRun.status == "running",
+                ).values(heartbeat_at=datetime.utcnow()))
+                await ses.commit()
+        except Exception as e:
+            logging.warning("Heartbeat du job %s échoué : %s", handle.job, e)
+
+
+async def job_history(job: str, limit: int = 5) -> list[JobRun]:
+    async with async_session() as ses:
+        return list((await ses.scalars(
+            select(JobRun).where(JobRun.job == job).order_by(JobRun.id.desc()).limit(limit)
+        )).all())
+
+
+# ───────────────────────────────  Scheduler  ──────────────────────────────
+Job = Callable[[JobRunHandle], Awaitable[Any]]
+Scopes = Callable[[datetime], list[str | None]]
+
+
+@dataclass
+class JobSpec:
+    spec: str                          # crontab UTC
+    fn: Job
+    scopes: Scopes
+    resume_window: float               # h
+
+
+def _single(now: datetime) -> list[str | None]:
+    return [None]
+
+
+class JobScheduler:
+    def __init__(self):
+        self.jobs: dict[str, JobSpec] = {}
+        self._crons: dict[str, aiocron.Cron] = {}
+
+    def job(self, name: str, spec: str, *, scopes: Scopes | None = None,
+            resume_window: float = JOB_RESUME_WINDOW):
+        """Déclare un job ; la fonction décorée s'appelle ensuite sans argument (`await job()`)."""
+        def decorator(fn: Job):
+            self.jobs[name] = JobSpec(spec, fn, scopes or _single, resume_window)
+
+            @functools.wraps(fn)
+            async def run_now():
+                return await self.run_due(name)
+            return run_now
+        return decorator
+
+    async def _execute(self, handle: JobRunHandle) -> Any:
+        fn = self.jobs[handle.job].fn
+        beat = asyncio.create_task(_heartbeat(handle))
+        try:
+            result = await fn(handle)
+        except asyncio.CancelledError:
+            await finish_run(handle, "interrupted", "arrêt du process")
+            raise
+        except Exception as e:
+            await finish_run(handle, "failed", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            beat.cancel()
+        await finish_run(handle, "done")
+        return result
+
+    async def due_scopes(self, name: str, now: datetime | None = None) -> list[str | None]:
+        """Scopes en retard (runs inachevés à reprendre) puis ceux de l'heure courante."""
+        job = self.jobs[name]
+        scopes = await pending_scopes(name, job.resume_window)
+        scopes += [s for s in job.scopes(now or datetime.utcnow()) if s not in scopes]
+        return scopes
+
+    async def run(self, name: str, scope: str | None = None) -> Any:
+        """Exécute un run du job jusqu'au bout (JobLocked si un run tourne déjà)."""
+        return await self._execute(await begin_run(name, scope, self.jobs[name].resume_window))
+
+    async def run_due(self, name: str) -> Any:
+        """Exécute tous les scopes dus ; renvoie le résultat du dernier run."""
+        result = None
+        for scope in await self.due_scopes(name):
+            result = await self.run(name, scope)
+        return result
+
+    async def trigger(
+        self, name: str,
+        on_finish: Callable[[JobRunHandle, BaseException | None], Awaitable[None]] | None = None,
+        scopes: Sequence[str | None] | None = None,
+    ) -> JobRunHandle:
+        """Prend le verrou du premier scope puis lance les runs en tâche de fond (commandes admin).
+
+        `scopes` : par défaut ceux dus maintenant (`due_scopes`) ; `on_finish` est
+        appelé après chaque run (un par scope).
+        """
+        scopes = list(await self.due_scopes(name) if scopes is None else scopes)
+        window = self.jobs[name].resume_window
+        first = await begin_run(name, scopes[0], window)
+
+        async def background():
+            for i, scope in enumerate(scopes):
+                try:
+                    handle = first if i == 0 else await begin_run(name, scope, window)
+                except JobLocked as e:
+                    logging.warning("Job %s (%s) non lancé : %s", name, scope or "-", e)
+                    return
+                error = None
+                try:
+                    await self._execute(handle)
+                except Exception as e:
+                    error = e
+                    logging.exception("Job %s (run #%s) en échec", name, handle.id)
+                if on_finish is not None:
+                    await on_finish(handle, error)
+
+        asyncio.create_task(background())
+        return first
+
+    async def _scheduled(self, name: str) -> None:
+        try:
+            scopes = await self.due_scopes(name)
+        except Exception:
+            logging.exception("Cron %s en échec", name)
+            return
+        # un scope en échec n'empêche pas les suivants ; un job verrouillé arrête le passage
+        for scope in scopes:
+            try:
+                await self.run(name, scope)
+            except JobLocked as e:
+                logging.warning("Cron %s ignoré : %s", name, e)
+                return
+            except Exception:
+                logging.exception("Cron %s (%s) en échec", name, scope or "-")
+
+    def start(self) -> None:
+        """Pose les crontabs sur l'event loop courant (à appeler depuis main())."""
+        loop = asyncio.get_running_loop()
+        for name, job in self.jobs.items():
+            self._crons[name] = aiocron.crontab(
+                job.spec, func=functools.partial(self._scheduled, name),
+                loop=loop, tz=timezone.utc, start=True,
+            )
+        logging.info("Crons planifiés : %s", ", ".join(f"{n} ({j.spec})" for n, j in self.jobs.items()))
+
+    def next_run(self, name: str) -> datetime:
+        return next(CronSim(self.jobs[name].spec, datetime.now(timezone.utc)))
@@ -0,0 +1,259 @@
+# services/metrics.py
+"""Métriques en mémoire (compteurs, histogrammes), façon prometheus_client.
+
+    REQS = Counter("bot_things_total", "Description", ("method",))
+    REQS.labels("sendMessage").inc()
+    LAT = Histogram("bot_latency_seconds", "Description", ("method",))
+    LAT.labels("sendMessage").observe(0.12)
+
+Chaque métrique créée s'enregistre dans `REGISTRY` ; `render()` produit le
+format texte Prometheus (route /metrics). Les valeurs tenues ailleurs (taille
+du pool DB, caches…) se déclarent avec `callback=` : lues au moment du rendu.
+
+Mode multi-process (services/workers.py) : chaque worker envoie `snapshot()`
+à l'ingress, qui garde le dernier de chacun dans `REMOTE` ; `items()` et
+`render()` les additionnent aux valeurs locales. `aggregate=False` pour une
+métrique déjà agrégée par sa source (quantiles de latence) ou propre à l'ingress.
+"""
+from __future__ import annotations
+
+import bisect
+from typing import Callable, Hashable, Iterable, Sequence
+
+# callback : [(valeurs de labels, valeur), …]
+Samples = Iterable[tuple[Sequence, float]]
+
+# secondes : de 5 ms (API locale) à 30 s (timeouts)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY: list["_Metric"] = []
+
+# dernier snapshot() reçu de chaque worker : {source: {nom de métrique: [(labels, état)]}}
+REMOTE: dict[Hashable, dict[str, list]] = {}
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 callback: Callable[[], Samples] | None = None, aggregate: bool = True):
+        if any(m.name == name for m in REGISTRY):
+            raise ValueError(f"métrique déjà déclarée : {name}")
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.aggregate = aggregate
+        self._children: dict[tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} attend les labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def items(self):
+        """(valeurs de labels, enfant) pour chaque série observée, workers compris."""
+        if not (REMOTE and self.aggregate):
+            return list(self._children.items())
+        merged: dict[tuple[str, ...], object] = {}
+        sources = [[(k, c.state()) for k, c in self._children.items()],
+                   *(snap.get(self.name, ()) for snap in REMOTE.values())]
+        for source in sources:
+            for key, state in source:
+                child = merged.get(key)
+                if child is None:
+                    child = merged[key] = self._new_child()
+                child.merge(state)
+        return list(merged.items())
+
+    def samples(self) -> list[tuple[tuple[str, ...], float]]:
+        """Métrique à callback : valeurs locales (+ workers si `aggregate`), additionnées par labels."""
+        totals: dict[tuple[str, ...], float] = {}
+        sources = [self.callback()]
+        if self.aggregate:
+            sources += [snap.get(self.name, ()) for snap in REMOTE.values()]
+        for source in sources:
+            for values, value in source:
+                key = tuple(str(v) for v in values)
+                totals[key] = totals.get(key, 0) + value
+        return list(totals.items())
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def state(self) -> float:
+        return self.value
+
+    def merge(self, state: float) -> None:
+        self.value += state
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        """Raccourci pour une métrique sans label."""
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def state(self) -> float:
+        return self.value
+
+    def merge(self, state: float) -> None:
+        self.value += state           # jauges additives : en vol, en attente, tailles
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "buckets", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)   # dernier = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def state(self) -> tuple[list[int], float, int]:
+        return list(self.buckets), self.sum, self.count
+
+    def merge(self, state: tuple[list[int], float, int]) -> None:
+        buckets, total, count = state
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+        self.sum += total
+        self.count += count
+
+    def quantile(self, q: float) -> float:
+        """Estimation par interpolation linéaire dans le bucket (comme histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank, seen, lower = q * self.count, 0, 0.0
+        for bound, n in zip(self.bounds, self.buckets):
+            if n and seen + n >= rank:
+                return lower + (bound - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return self.bounds[-1]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, aggregate: bool = True):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames, aggregate=aggregate)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+# ───────────────────────────────  Workers  ────────────────────────────────
+def snapshot() -> dict[str, list]:
+    """Valeurs de ce process (picklables), à additionner dans `REMOTE` d'un autre process."""
+    snap: dict[str, list] = {}
+    for m in REGISTRY:
+        if not m.aggregate:
+            continue
+        if m.callback is None:
+            snap[m.name] = [(k, c.state()) for k, c in m._children.items()]
+            continue
+        try:
+            snap[m.name] = [(tuple(str(v) for v in values), value) for values, value in m.callback()]
+        except Exception:           # source HS : la métrique manque dans ce snapshot
+            pass
+    return snap
+
+
+# ───────────────────────────────  Export  ─────────────────────────────────
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """Toutes les métriques de REGISTRY au format texte Prometheus 0.0.4."""
+    out: list[str] = []
+    for m in REGISTRY:
+        out.append(f"# HELP {m.name} {m.doc}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        if m.callback is not None:
+            try:
+                samples = m.samples()
+            except Exception as e:          # une source HS ne doit pas casser tout l'export
+                out.append(f"# erreur de collecte : {e}")
+                continue
+            for values, value in samples:
+                out.append(f"{m.name}{_labels(m.labelnames, values)} {_fmt(value)}")
+            continue
+        for values, child in m.items():
+            if isinstance(child, _HistogramChild):
+                cumulative = 0
+                for bound, n in zip((*child.bounds, float("inf")), child.buckets):
+                    cumulative += n
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{_fmt(bound)}"'
+                    out.append(f"{m.name}_bucket{_labels(m.labelnames, values, le)} {cumulative}")
+                out.append(f"{m.name}_sum{_labels(m.labelnames, values)} {_fmt(child.sum)}")
+                out.append(f"{m.name}_count{_labels(m.labelnames, values)} {child.count}")
+            else:
+                out.append(f"{m.name}{_labels(m.labelnames, values)} {_fmt(child.value)}")
+    return "\n".join(out) + "\n"
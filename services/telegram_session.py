@@ -0,0 +1,92 @@
+# services/telegram_session.py
+"""Session HTTP du `Bot` : pool de connexions réglé + métriques par méthode Bot API.
+
+• Pool : `TG_POOL_SIZE` connexions keep-alive vers api.telegram.org (les
+  diffusions n'affament plus les handlers), cache DNS `TG_DNS_TTL`.
+• Timeouts par méthode (`TG_METHOD_TIMEOUTS`), `TG_TIMEOUT` sinon.
+• Latence (histogramme), erreurs et 429 par méthode : voir `telegram_stats()`.
+"""
+from __future__ import annotations
+
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from config import TG_POOL_SIZE, TG_KEEPALIVE, TG_DNS_TTL, TG_TIMEOUT, TG_METHOD_TIMEOUTS
+from services.metrics import Counter, Histogram
+from services.tracing import add_telegram_time
+
+TG_LATENCY = Histogram(
+    "bot_telegram_request_seconds", "Durée des appels Bot API", ("method",),
+)
+TG_ERRORS = Counter(
+    "bot_telegram_errors_total", "Appels Bot API en erreur", ("method", "error"),
+)
+TG_RATE_LIMITED = Counter(
+    "bot_telegram_retry_after_total", "Réponses 429 (RetryAfter) de Telegram", ("method",),
+)
+
+
+class InstrumentedSession(AiohttpSession):
+    def __init__(
+        self,
+        *,
+        limit: int = TG_POOL_SIZE,
+        keepalive: float = TG_KEEPALIVE,
+        dns_ttl: int = TG_DNS_TTL,
+        timeout: float = TG_TIMEOUT,
+        method_timeouts: dict[str, float] = TG_METHOD_TIMEOUTS,
+        **kwargs,
+    ):
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        self._connector_init.update(
+            limit_per_host=limit,          # tout part vers le même hôte
+            ttl_dns_cache=dns_ttl,
+            keepalive_timeout=keepalive,
+        )
+        self.method_timeouts = dict(method_timeouts)
+
+    async def make_request(
+        self,
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+        timeout: int | None = None,
+    ) -> TelegramType:
+        name = method.__api_method__
+        if timeout is None:
+            timeout = self.method_timeouts.get(name)
+        t0 = time.perf_counter()
+        try:
+            return await super().make_request(bot, method, timeout)
+        except TelegramRetryAfter:
+            TG_RATE_LIMITED.labels(name).inc()
+            TG_ERRORS.labels(name, "TelegramRetryAfter").inc()
+            raise
+        except (TelegramAPIError, TelegramNetworkError) as e:
+            TG_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - t0
+            TG_LATENCY.labels(name).observe(elapsed)
+            add_telegram_time(elapsed)
+
+
+def telegram_stats() -> list[dict]:
+    """Résumé par méthode, trié par temps total (là où part le temps sortant)."""
+    errors: dict[str, float] = {}
+    for (method, _), c in TG_ERRORS.items():
+        errors[method] = errors.get(method, 0) + c.value
+    limited = {method: c.value for (method,), c in TG_RATE_LIMITED.items()}
+    rows = [
+        {
+            "method": method, "count": h.count, "total": h.sum,
+            "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+            "errors": int(errors.get(method, 0)), "retry_after": int(limited.get(method, 0)),
+        }
+        for (method,), h in TG_LATENCY.items()
+    ]
+    return sorted(rows, key=lambda r: r["total"], reverse=True)
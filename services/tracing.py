@@ -0,0 +1,180 @@
+# services/tracing.py
+"""Trace par update (ou par run de cron) : qui l'a traité, combien de temps, où est parti ce temps.
+
+• `UpdateTrace` vit dans la contextvar `current_trace` pendant le traitement
+  (posée par le middleware outer et par `track_job`, services/bot_metrics.py).
+• Le SQL est compté par des hooks SQLAlchemy (requêtes, sessions, temps, requêtes
+  identiques répétées → N+1), le temps Bot API par InstrumentedSession :
+  d'où la répartition DB / Telegram / reste.
+• Requête plus lente que `SLOW_QUERY_MS` : loggée avec son EXPLAIN QUERY PLAN.
+• `handler_latency` garde une fenêtre glissante par handler (p50/p95/p99) ;
+  en mode multi-process, celles des workers arrivent dans `remote_latency`.
+"""
+from __future__ import annotations
+
+import logging, time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Hashable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from config import LATENCY_WINDOW, SLOW_QUERY_MS, SQL_REPEAT_WARN
+
+
+@dataclass
+class UpdateTrace:
+    update_id: int
+    kind: str
+    handler: str = "unhandled"          # "main_router.handle_sos" une fois le handler connu
+    started: float = field(default_factory=time.perf_counter)
+    db_time: float = 0.0
+    db_queries: int = 0
+    db_sessions: int = 0
+    statements: Counter[str] = field(default_factory=Counter)
+    tg_time: float = 0.0
+    tg_calls: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def breakdown(self) -> str:
+        total = self.elapsed
+        other = max(total - self.db_time - self.tg_time, 0.0)
+        # temps cumulés : des appels concurrents (gather, Broadcaster) peuvent dépasser le total
+        return (f"{total * 1000:.0f} ms — DB {self.db_time * 1000:.0f} ms / {self.db_queries} req "
+                f"/ {self.db_sessions} sessions, "
+                f"Telegram {self.tg_time * 1000:.0f} ms / {self.tg_calls} appels, "
+                f"reste {other * 1000:.0f} ms")
+
+    def repeated(self, threshold: int = SQL_REPEAT_WARN) -> list[tuple[str, int]]:
+        """Requêtes identiques exécutées au moins `threshold` fois (N+1 probable)."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+    def report_repeated(self, label: str, level: int = logging.WARNING) -> None:
+        for sql, n in self.repeated():
+            logging.log(level, "N+1 probable dans %s : %s× %s", label, n, " ".join(sql.split()))
+
+
+current_trace: ContextVar[UpdateTrace | None] = ContextVar("current_trace", default=None)
+
+
+# ───────────────────────────────  Temps SQL  ──────────────────────────────
+# Écouteurs sur la classe Engine : couvrent l'engine d'écriture et celui de lecture.
+# Exécutés dans le greenlet de SQLAlchemy, qui hérite du contexte de la coroutine.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("trace_t0", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["trace_t0"].pop()
+    if conn.info.get("explaining"):
+        return
+    trace = current_trace.get()
+    if trace is not None:
+        trace.db_time += elapsed
+        trace.db_queries += 1
+        trace.statements[statement] += 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        _log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed: float) -> None:
+    plan = ""
+    if conn.dialect.name == "sqlite" and not executemany:
+        conn.info["explaining"] = True
+        try:
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            plan = "\n" + "\n".join(f"  {r[-1]}" for r in rows)
+        except Exception as e:
+            plan = f"\n  (EXPLAIN impossible : {e})"
+        finally:
+            conn.info["explaining"] = False
+    trace = current_trace.get()
+    logging.warning("Requête lente %.0f ms%s : %s%s", elapsed * 1000,
+                    f" ({trace.handler})" if trace else "", " ".join(statement.split()), plan)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    stack = exception_context.connection.info.get("trace_t0") if exception_context.connection else None
+    if stack:
+        stack.pop()
+
+
+@event.listens_for(Session, "after_begin")
+def _after_begin(session, transaction, connection):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.db_sessions += 1
+
+
+def add_telegram_time(seconds: float) -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        trace.tg_time += seconds
+        trace.tg_calls += 1
+
+
+# ───────────────────────────────  Latence  ────────────────────────────────
+class RollingLatency:
+    """Les `size` dernières durées d'un handler ; quantiles calculés à la demande."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def quantiles(self, *qs: float) -> list[float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [0.0 for _ in qs]
+        return [ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in qs]
+
+
+handler_latency: dict[str, RollingLatency] = {}
+# dernier latency_snapshot() de chaque worker : {source: {handler: (count, durées)}}
+remote_latency: dict[Hashable, dict[str, tuple[int, list[float]]]] = {}
+
+
+def record_latency(handler: str, seconds: float) -> None:
+    window = handler_latency.get(handler)
+    if window is None:
+        window = handler_latency[handler] = RollingLatency()
+    window.add(seconds)
+
+
+def latency_snapshot() -> dict[str, tuple[int, list[float]]]:
+    return {handler: (w.count, list(w.samples)) for handler, w in handler_latency.items()}
+
+
+def latency_summary() -> list[dict]:
+    """p50/p95/p99 par handler sur la fenêtre glissante, du plus lent au plus rapide (p95).
+
+    Workers compris : leurs fenêtres sont fusionnées avant le calcul des quantiles.
+    """
+    windows = dict(handler_latency)
+    for snap in remote_latency.values():
+        for handler, (count, samples) in snap.items():
+            local = windows.get(handler)
+            merged = windows[handler] = RollingLatency(
+                (len(local.samples) if local else 0) + len(samples) or 1)
+            if local is not None:
+                merged.samples.extend(local.samples)
+                merged.count = local.count
+            merged.samples.extend(samples)
+            merged.count += count
+    rows = []
+    for handler, window in windows.items():
+        p50, p95, p99 = window.quantiles(0.5, 0.95, 0.99)
+        rows.append({"handler": handler, "count": window.count, "p50": p50, "p95": p95, "p99": p99})
+    return sorted(rows, key=lambda r: r["p95"], reverse=True)
@@ -0,0 +1,151 @@
+# services/tribute.py
+"""Webhook Tribute : accusé de réception immédiat + traitement en tâche de fond.
+
+• `handle` enregistre l'événement brut (clé d'idempotence = sha256 du corps)
+  et répond 200 tout de suite : une re-livraison identique ne coûte qu'un INSERT ignoré.
+• `TributeWorker.run` applique l'abonnement (un upsert) puis envoie
+  le lien d'invitation ; les événements restés "pending" après un crash sont repris.
+"""
+from __future__ import annotations
+
+import asyncio, hashlib, json, logging
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiohttp import web
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql import func
+
+from config import SUPER_GROUP
+from database.database import async_session
+from database.utils import upsert_membership
+from database.webhook_event import WebhookEvent
+from services.metrics import Counter
+
+# Tribute envoie "new_subscription" (snake_case). Par prudence on accepte aussi camelCase.
+SUBSCRIPTION_EVENTS = {"new_subscription", "newSubscription"}
+MAX_ATTEMPTS = 5
+IDLE_POLL = 30     # secondes : filet de sécurité si un réveil est manqué
+
+WEBHOOK_RECEIVED = Counter(
+    "bot_webhook_events_total", "Webhooks Tribute reçus", ("result",),   # accepted | duplicate | ignored | bad_request
+)
+WEBHOOK_PROCESSED = Counter(
+    "bot_webhook_processed_total", "Événements Tribute traités", ("status",),  # done | pending (retry) | failed
+)
+
+
+def parse_expires(payload: dict) -> datetime:
+    """paid_until = expires_at du webhook (ISO, termine par 'Z'), sinon +31 jours."""
+    raw_expires = payload.get("expires_at")
+    if raw_expires:
+        try:
+            # "2025-04-20T01:15:57.305733Z" -> datetime UTC
+            return datetime.fromisoformat(raw_expires.replace("Z", "+00:00"))
+        except Exception as e:
+            logging.warning("Parse expires_at échoué (%s): %s", raw_expires, e)
+    # Fallback si jamais expires_at absent ou invalide
+    return datetime.utcnow() + timedelta(days=31)
+
+
+class TributeWorker:
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._wake = asyncio.Event()
+
+    # ─────────────────────────────  réception  ────────────────────────────
+    async def handle(self, request: web.Request) -> web.Response:
+        raw = await request.read()
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            WEBHOOK_RECEIVED.labels("bad_request").inc()
+            return web.Response(text="bad request", status=400)
+        logging.warning("WEBHOOK DATA %s", data)
+
+        event_name = (data.get("name") or "").strip()
+        if event_name not in SUBSCRIPTION_EVENTS:
+            # (Facultatif) autres events ignorés proprement
+            WEBHOOK_RECEIVED.labels("ignored").inc()
+            return web.Response(text="ignored")
+
+        payload = data.get("payload") or {}
+        try:
+            int(payload["telegram_user_id"])
+        except Exception:
+            logging.error("Webhook: telegram_user_id manquant ou invalide: %s", payload)
+            WEBHOOK_RECEIVED.labels("bad_request").inc()
+            return web.Response(text="bad request", status=400)
+
+        async with async_session() as ses:
+            res = await ses.execute(sqlite_insert(WebhookEvent).values(
+                idem_key=hashlib.sha256(raw).hexdigest(),
+                name=event_name,
+                body=raw.decode("utf-8", "replace"),
+            ).on_conflict_do_nothing(index_elements=[WebhookEvent.idem_key]))
+            await ses.commit()
+        WEBHOOK_RECEIVED.labels("accepted" if res.rowcount else "duplicate").inc()
+
+        self._wake.set()
+        return web.Response(text="ok")
+
+    # ─────────────────────────────  traitement  ───────────────────────────
+    async def process(self, event: WebhookEvent) -> None:
+        payload = json.loads(event.body).get("payload") or {}
+        uid = int(payload["telegram_user_id"])
+        until = parse_expires(payload)
+
+        # 1) Upsert user + statut membre
+        await upsert_membership(uid, until)
+
+        # 2) Lien d’invitation one-shot (utile si pas encore dans le groupe)
+        try:
+            invite = await self.bot.create_chat_invite_link(SUPER_GROUP, member_limit=1)
+            await self.bot.send_message(
+                uid,
+                f"🎉 Оплата принята!\n"
+                f"Доступ активен до <b>{until.strftime('%d.%m.%Y')}</b>.\n"
+                f"➡️ Вступай: {invite.invite_link}"
+            )
+        except Exception as e:
+            logging.warning("Invite link fail for %s: %s", uid, e)
+
+    async def _finish(self, event_id: int, status: str, error: str | None = None) -> None:
+        WEBHOOK_PROCESSED.labels(status).inc()
+        async with async_session() as ses:
+            await ses.execute(
+                update(WebhookEvent).where(WebhookEvent.id == event_id).values(
+                    status=status, error=error, processed_at=func.now(),
+                    attempts=WebhookEvent.attempts + 1,
+                )
+            )
+            await ses.commit()
+
+    async def drain(self) -> int:
+        """Traite les événements en attente, dans l'ordre de réception."""
+        async with async_session() as ses:
+            events = (await ses.scalars(
+                select(WebhookEvent).where(WebhookEvent.status == "pending").order_by(WebhookEvent.id)
+            )).all()
+        for event in events:
+            try:
+                await self.process(event)
+                await self._finish(event.id, "done")
+            except Exception as e:
+                logging.exception("Webhook event %s failed", event.id)
+                status = "failed" if event.attempts + 1 >= MAX_ATTEMPTS else "pending"
+                await self._finish(event.id, status, str(e))
+        return len(events)
+
+    async def run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                logging.warning("Tribute worker: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), IDLE_POLL)
+            except asyncio.TimeoutError:
+                pass
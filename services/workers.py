@@ -0,0 +1,312 @@
+# services/workers.py
+"""Mode multi-process : un process d'entrée (ingress) + `WORKERS` process de traitement.
+
+• L'ingress garde tout ce qui est unique : réception des updates (polling ou
+  webhook), crons, webhooks Tribute, /metrics. Il ne traite aucun handler :
+  `WorkerPool` (middleware outer sur `dp.update`) envoie chaque update au
+  worker `clé % N`, clé = user de l'update (sinon chat) ; les likes sont
+  routés par message (un seul worker regroupe les éditions d'un post).
+• Chaque worker est un process avec son propre event loop, son Bot (pool HTTP)
+  et le même `dp` (tous les routers) ; il traite en parallèle des users
+  différents mais les updates d'un même user l'un après l'autre, dans l'ordre
+  (les likes, eux, en parallèle : le MarkupCoalescer ordonne les éditions).
+  Un update qui attend son prédécesseur n'occupe pas de slot de concurrence.
+• L'état FSM vit dans le stockage partagé (SQLite ou Redis, pas "memory").
+  Comme un user est toujours traité par le même worker, chaque clé FSM n'est
+  touchée que par un process : le cache du SQLiteStorage reste cohérent.
+• Un worker mort est relancé sur la même file.
+• État par process, synchronisé par la file `reports` (workers → ingress) :
+  – caches user/post : toute invalidation (ingress : Tribute, crons ; worker :
+    handlers) est relayée aux autres process en moins de INVALIDATION_FLUSH s ;
+  – métriques et latences : chaque worker envoie un snapshot toutes les
+    METRICS_PUSH s, additionné par l'ingress (/metrics, /latency, /tg_stats).
+• Les commandes admin qui pilotent les crons ou lisent ces stats (`local=`)
+  sont traitées par l'ingress lui-même, jamais par un worker.
+"""
+from __future__ import annotations
+
+import asyncio, logging, multiprocessing as mp, queue as stdqueue, signal
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from config import WORKER_CONCURRENCY, WORKER_QUEUE_SIZE
+from database.utils import apply_invalidations, set_invalidation_hook
+from services import metrics, tracing
+from services.metrics import Counter, Gauge
+from services.tracing import current_trace
+
+ROUTED = Counter(
+    "bot_worker_routed_total", "Updates envoyés par l'ingress à chaque worker", ("worker",),
+)
+RESTARTS = Counter(
+    "bot_worker_restarts_total", "Workers relancés après un arrêt inattendu", ("worker",),
+)
+
+HEALTH_INTERVAL = 5        # secondes entre deux vérifications des process
+INVALIDATION_FLUSH = 0.1   # secondes max avant de relayer une invalidation de cache
+METRICS_PUSH = 5           # secondes entre deux snapshots de métriques d'un worker
+
+Invalidation = tuple[str, Any]     # (nom du cache, clé ; None = tout le cache)
+
+
+# Callbacks qui ne modifient que leur message (clavier ❤️ via MarkupCoalescer, par
+# process) et aucun état FSM : routés par message, pour que toutes les éditions
+# d'un même message soient regroupées par un seul worker. Ils ne sont pas
+# sérialisés pour autant : un post viral ne doit pas faire la queue derrière lui-même.
+MESSAGE_KEYED_CALLBACKS = ("like:",)
+
+
+def _message_keyed(update: Update) -> bool:
+    cq = update.callback_query
+    return cq is not None and cq.message is not None and (cq.data or "").startswith(MESSAGE_KEYED_CALLBACKS)
+
+
+def route_key(update: Update) -> int:
+    """Choix du worker : comme order_key, sauf MESSAGE_KEYED_CALLBACKS, routés par (chat, message)."""
+    if _message_keyed(update):
+        message = update.callback_query.message
+        return hash((message.chat.id, message.message_id))
+    return order_key(update)
+
+
+def order_key(update: Update) -> int | None:
+    """Clé de sérialisation dans le worker : user de l'update (message, callback…),
+    sinon chat, sinon l'update lui-même ; None (aucun ordre) pour MESSAGE_KEYED_CALLBACKS.
+    """
+    if _message_keyed(update):
+        return None
+    try:
+        event = update.event
+    except Exception:              # type d'update inconnu de cette version d'aiogram
+        return update.update_id
+    for attr in ("from_user", "user"):
+        user = getattr(event, attr, None)
+        if user is not None:
+            return user.id
+    chat = getattr(event, "chat", None)
+    return chat.id if chat is not None else update.update_id
+
+
+# ───────────────────────────────  Ingress  ────────────────────────────────
+class WorkerPool(BaseMiddleware):
+    """
+    Lance les workers (`target(index, queue, reports)`, fonction de niveau module)
+    et leur distribue les updates. À poser en outer middleware sur `dp.update` :
+    l'update ne descend plus dans les routers de l'ingress, sauf si `local(update)`.
+    """
+
+    def __init__(self, target: Callable[[int, Any, Any], None], size: int, *,
+                 local: Callable[[Update], bool] | None = None,
+                 queue_size: int = WORKER_QUEUE_SIZE):
+        # spawn : pas de fork d'un process qui a déjà un event loop et des threads aiosqlite
+        self._ctx = mp.get_context("spawn")
+        self.target = target
+        self.local = local
+        self.queues = [self._ctx.Queue(queue_size) for _ in range(size)]
+        self.reports = self._ctx.Queue()
+        self.procs: list[mp.process.BaseProcess | None] = [None] * size
+        self._tasks: list[asyncio.Task] = []
+        self._collector: asyncio.Task | None = None
+        self._invalidations: list[tuple[int | None, Invalidation]] = []   # (process d'origine, …)
+        self._stopping = False
+        Gauge("bot_worker_queue_depth", "Updates en attente par worker", ("worker",),
+              callback=lambda: [((i,), q.qsize()) for i, q in enumerate(self.queues)],
+              aggregate=False)
+
+    def _spawn(self, index: int) -> None:
+        proc = self._ctx.Process(target=self.target, args=(index, self.queues[index], self.reports),
+                                 name=f"bot-worker-{index}", daemon=True)
+        proc.start()
+        self.procs[index] = proc
+
+    def start(self) -> None:
+        set_invalidation_hook(lambda cache, key: self._invalidations.append((None, (cache, key))))
+        for i in range(len(self.queues)):
+            self._spawn(i)
+        self._tasks = [asyncio.create_task(self._watch()), asyncio.create_task(self._relay())]
+        self._collector = asyncio.create_task(self._collect())
+        logging.info("Workers démarrés : %s process", len(self.queues))
+
+    async def _watch(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            for i, proc in enumerate(self.procs):
+                if proc is not None and not proc.is_alive() and not self._stopping:
+                    logging.error("Worker %s arrêté (code %s), relance", i, proc.exitcode)
+                    RESTARTS.labels(i).inc()
+                    self._spawn(i)
+
+    async def _collect(self) -> None:
+        """Lit `reports` : snapshots de métriques et invalidations venues des workers."""
+        while True:
+            report = await asyncio.to_thread(self.reports.get)
+            if report is None:
+                return
+            kind, index, payload = report
+            if kind == "metrics":
+                metrics.REMOTE[index], tracing.remote_latency[index] = payload
+            elif kind == "invalidate":
+                apply_invalidations(payload)
+                self._invalidations.extend((index, inv) for inv in payload)
+
+    async def _put(self, index: int, item) -> None:
+        try:
+            self.queues[index].put_nowait(item)
+        except stdqueue.Full:
+            # file pleine : on attend sans bloquer l'event loop (back-pressure vers l'ingress)
+            await asyncio.to_thread(self.queues[index].put, item)
+
+    async def _relay(self) -> None:
+        """Envoie à chaque worker les invalidations des autres process (par lots)."""
+        while not self._stopping:
+            await asyncio.sleep(INVALIDATION_FLUSH)
+            pending, self._invalidations = self._invalidations, []
+            for i in range(len(self.queues)):
+                batch = [inv for origin, inv in pending if origin != i]
+                if batch:
+                    await self._put(i, ("invalidate", None, batch))
+
+    async def dispatch(self, update: Update) -> int:
+        index = route_key(update) % len(self.queues)
+        raw = update.model_dump_json(by_alias=True, exclude_none=True)
+        await self._put(index, ("update", order_key(update), raw))
+        ROUTED.labels(index).inc()
+        return index
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        if self.local is not None and self.local(event):
+            return await handler(event, data)
+        index = await self.dispatch(event)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.handler = f"ingress.worker{index}"
+        return None
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Les workers finissent leur file puis s'arrêtent (sentinelle None)."""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        for q in self.queues:
+            try:
+                q.put_nowait(None)
+            except stdqueue.Full:      # worker en retard (ou mort : terminate() plus bas)
+                try:
+                    await asyncio.to_thread(q.put, None, True, timeout)
+                except stdqueue.Full:
+                    pass
+        for proc in self.procs:
+            if proc is not None:
+                await asyncio.to_thread(proc.join, timeout)
+                if proc.is_alive():
+                    proc.terminate()
+        # après les derniers snapshots des workers : le collecteur les lit puis s'arrête
+        self.reports.put(None)
+        if self._collector is not None:
+            await self._collector
+        set_invalidation_hook(None)
+
+
+# ───────────────────────────────  Worker  ─────────────────────────────────
+async def _report(index: int, reports, outbox: list[Invalidation]) -> None:
+    """Worker → ingress : invalidations toutes les INVALIDATION_FLUSH s, métriques toutes les METRICS_PUSH s."""
+    loop = asyncio.get_running_loop()
+    pushed = loop.time()
+    while True:
+        await asyncio.sleep(INVALIDATION_FLUSH)
+        _flush(index, reports, outbox)
+        if loop.time() - pushed >= METRICS_PUSH:
+            _push_metrics(index, reports)
+            pushed = loop.time()
+
+
+def _flush(index: int, reports, outbox: list[Invalidation]) -> None:
+    if outbox:
+        reports.put(("invalidate", index, list(outbox)))
+        outbox.clear()
+
+
+def _push_metrics(index: int, reports) -> None:
+    reports.put(("metrics", index, (metrics.snapshot(), tracing.latency_snapshot())))
+
+
+async def serve(dp: Dispatcher, bot: Bot, index: int, queue, reports, *,
+                concurrency: int = WORKER_CONCURRENCY, backlog_size: int = WORKER_QUEUE_SIZE) -> None:
+    """Boucle d'un worker : lit sa file et passe chaque update à `dp.feed_update`.
+
+    `slots` borne les updates en cours de traitement ; un update n'en prend un
+    qu'une fois son prédécesseur (même clé) terminé. `backlog` borne les updates
+    lus mais pas finis (en attente compris) : back-pressure vers la file.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    backlog = asyncio.Semaphore(backlog_size)
+    tails: dict[int, asyncio.Task] = {}     # dernier update en cours par clé (user/chat)
+    inflight: set[asyncio.Task] = set()
+    outbox: list[Invalidation] = []
+    set_invalidation_hook(lambda cache, key: outbox.append((cache, key)))
+    reporter = asyncio.create_task(_report(index, reports, outbox))
+
+    async def handle(previous: asyncio.Task | None, raw: str) -> None:
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])       # ordre par user ; son échec ne nous concerne pas
+            async with slots:
+                update = Update.model_validate_json(raw, context={"bot": bot})
+                await dp.feed_update(bot, update)
+        except Exception:
+            logging.exception("Worker %s : échec du traitement d'un update", index)
+        finally:
+            backlog.release()
+
+    def forget(key: int, task: asyncio.Task) -> None:
+        if tails.get(key) is task:
+            del tails[key]
+
+    logging.info("Worker %s prêt", index)
+    try:
+        running = True
+        while running:
+            # attente bloquante dans un thread, puis on vide ce qui est déjà là sans thread
+            batch = [await asyncio.to_thread(queue.get)]
+            try:
+                while len(batch) < concurrency:
+                    batch.append(queue.get_nowait())
+            except stdqueue.Empty:
+                pass
+            for item in batch:
+                if item is None:
+                    running = False
+                    break
+                kind, key, payload = item
+                if kind == "invalidate":            # invalidations venues des autres process
+                    apply_invalidations(payload)
+                    continue
+                await backlog.acquire()
+                task = asyncio.create_task(handle(tails.get(key) if key is not None else None, payload))
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+                if key is not None:
+                    tails[key] = task
+                    task.add_done_callback(lambda t, k=key: forget(k, t))
+        if inflight:
+            await asyncio.wait(list(inflight))
+    finally:
+        reporter.cancel()
+        await dp.storage.close()
+        await bot.session.close()
+        _flush(index, reports, outbox)
+        _push_metrics(index, reports)
+        logging.info("Worker %s arrêté", index)
+
+
+def run_worker(dp: Dispatcher, bot: Bot, index: int, queue, reports) -> None:
+    """Corps synchrone du process worker ; Ctrl+C est géré par l'ingress (sentinelle)."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(serve(dp, bot, index, queue, reports))
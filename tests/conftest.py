@@ -0,0 +1,18 @@
+# tests/conftest.py
+"""Environnement du projet pour pytest : à poser AVANT le premier import du projet.
+
+config.py lit config.yml dans le répertoire courant et DB_PATH / TELEGRAM_TOKEN
+à l'import : racine du projet en cwd et dans sys.path, base SQLite jetable.
+"""
+import os, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+_tmp = tempfile.TemporaryDirectory(prefix="tests-")
+
+os.chdir(ROOT)
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+os.environ["DB_PATH"] = f"sqlite+aiosqlite:///{Path(_tmp.name) / 'test.db'}"
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:TESTTESTTESTTESTTESTTESTTESTTESTTE")
+os.environ.setdefault("FSM_STORAGE", "memory")
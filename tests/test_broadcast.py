@@ -0,0 +1,49 @@
+# tests/test_broadcast.py
+"""Posts dans un groupe : bucket par chat, un flood control du groupe ne gèle pas les DM."""
+import asyncio, time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from config import GROUP_RATE_PER_MIN
+from services import broadcast
+from services.broadcast import Broadcaster, TokenBucket, chat_bucket
+
+GROUP = -1009999999999
+
+
+def test_group_flood_control_pauses_only_the_group_bucket(monkeypatch):
+    monkeypatch.setattr(broadcast, "GROUP_RATE_PER_MIN", 6000)      # pas d'attente après la pause
+    monkeypatch.setattr(broadcast, "CHAT_BUCKETS", {})
+
+    async def scenario():
+        global_bucket = TokenBucket(1000)
+        bc = Broadcaster("test", bucket=global_bucket)
+        calls = {"group": 0}
+
+        async def post():
+            calls["group"] += 1
+            if calls["group"] == 1:
+                raise TelegramRetryAfter(method=SendMessage(chat_id=GROUP, text="x"),
+                                         message="Too Many Requests", retry_after=1)
+            return "posted"
+
+        async def dm():
+            return "dm"
+
+        group = asyncio.create_task(bc.call_in_chat(GROUP, post))
+        await asyncio.sleep(0.05)               # le post est en pause (429)
+        t0 = time.monotonic()
+        dm_result = await bc.call(dm)
+        dm_wait = time.monotonic() - t0
+        return await group, dm_result, dm_wait
+
+    posted, dm_result, dm_wait = asyncio.run(scenario())
+    assert (posted, dm_result) == ("posted", "dm")
+    assert dm_wait < 0.5
+
+
+def test_group_bucket_follows_the_per_minute_limit():
+    bucket = chat_bucket(GROUP)
+    assert bucket is chat_bucket(GROUP)
+    assert bucket.rate * 60 == GROUP_RATE_PER_MIN
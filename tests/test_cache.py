@@ -0,0 +1,57 @@
+# tests/test_cache.py
+"""Caches d'entités : invalidation ciblée, pas de valeur périmée réinsérée après une écriture."""
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy import insert, select
+
+from database.database import Base, engine
+from database.user import User
+import database.utils as utils
+from database.utils import EntityCache, bulk_update_users, get_user, user_cache
+
+
+def test_bulk_update_invalidates_only_the_batch():
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User), [{"telegram_id": 900 + i, "pseudo": f"c{i}"} for i in range(3)])
+            ids = (await conn.scalars(
+                select(User.id).where(User.telegram_id.in_([900, 901, 902])).order_by(User.telegram_id)
+            )).all()
+        for i in range(3):
+            user_cache.set(900 + i, f"user {i}")
+        await bulk_update_users([{"id": ids[0], "last_checkpoint": 7}, {"id": ids[1], "last_checkpoint": 7}])
+        return [user_cache.get(900 + i) for i in range(3)]
+
+    assert asyncio.run(scenario()) == [None, None, "user 2"]
+
+
+def test_read_overlapping_an_invalidation_is_not_cached():
+    cache = EntityCache("test")
+    since = cache.generation()
+    cache.invalidate("a")                   # écriture pendant la lecture
+    cache.set("a", "ancienne valeur", since=since)
+    cache.set("b", "b", since=since)
+    assert cache.get("a") is None and cache.get("b") == "b"
+
+
+def test_get_user_racing_a_write_does_not_cache_the_old_row(monkeypatch):
+    read_session = utils.get_read_session
+
+    @asynccontextmanager
+    async def racing_read_session():
+        async with read_session() as ses:
+            yield ses
+            user_cache.invalidate(950)      # update_user committé pendant la lecture
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User), [{"telegram_id": 950, "pseudo": "race"}])
+        monkeypatch.setattr(utils, "get_read_session", racing_read_session)
+        user = await get_user(950)
+        return user, user_cache.get(950)
+
+    user, cached = asyncio.run(scenario())
+    assert user is not None and cached is None
@@ -0,0 +1,39 @@
+# tests/test_coalescer.py
+"""MarkupCoalescer : le clavier envoyé reflète l'état au moment de l'édition, pas celui du tap."""
+import asyncio
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from services.edit_coalescer import MarkupCoalescer
+
+
+class _Bot:
+    def __init__(self):
+        self.sent: list[str] = []
+
+    async def edit_message_reply_markup(self, *, chat_id, message_id, reply_markup):
+        self.sent.append(reply_markup.inline_keyboard[0][0].text)
+
+
+def test_interleaved_like_unlike_ends_on_the_current_count():
+    async def scenario():
+        bot, coalescer, likes = _Bot(), MarkupCoalescer(window=0.01), {"n": 0}
+
+        async def render():
+            return InlineKeyboardMarkup(inline_keyboard=[[
+                InlineKeyboardButton(text=f"❤️ {likes['n']}", callback_data="like:1"),
+            ]])
+
+        likes["n"] = 1                      # like committé…
+        likes["n"] = 0                      # …puis unlike, dont le handler planifie en premier
+        coalescer.schedule(bot, -100, 1, render)
+        coalescer.schedule(bot, -100, 1, render)
+        await asyncio.sleep(0.05)
+        likes["n"] = 2                      # tap suivant, après l'envoi
+        coalescer.schedule(bot, -100, 1, render)
+        await asyncio.sleep(0.05)
+        return bot.sent, coalescer.stats()
+
+    sent, stats = asyncio.run(scenario())
+    assert sent == ["❤️ 0", "❤️ 2"]
+    assert stats["coalesced"] == 1 and stats["pending"] == 0
@@ -0,0 +1,105 @@
+# tests/test_expire.py
+"""Cron d'expiration : le ban temporaire garde plus de 30 s après un flood control (sinon ban définitif)."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import BanChatMember
+from sqlalchemy import insert
+
+import bot as app
+from database.database import Base, engine
+from database.migrations import upgrade
+from database.user import User
+from database.utils import kick_backlog
+from services import broadcast
+
+
+class Clock:
+    """Heure simulée : les pauses du bucket l'avancent au lieu d'attendre."""
+
+    def __init__(self):
+        self.now = datetime.now(timezone.utc)
+
+    def datetime_cls(self):
+        clock = self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now if tz else clock.now.replace(tzinfo=None)
+
+            @classmethod
+            def utcnow(cls):
+                return clock.now.replace(tzinfo=None)
+        return FakeDatetime
+
+
+class Bucket:
+    def __init__(self, clock: Clock):
+        self.clock = clock
+
+    async def acquire(self):
+        pass
+
+    def pause(self, seconds: float):
+        self.clock.now += timedelta(seconds=seconds)
+
+
+class Session(BaseSession):
+    """Premier ban de chaque user : flood control de `retry_after` s."""
+
+    def __init__(self, clock: Clock, retry_after: int):
+        super().__init__()
+        self.clock, self.retry_after = clock, retry_after
+        self.bans: list[tuple[int, float]] = []       # (user, secondes de ban restantes à l'envoi)
+        self._limited: set[int] = set()
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, BanChatMember):
+            if method.user_id not in self._limited:
+                self._limited.add(method.user_id)
+                raise TelegramRetryAfter(method=method, message="Too Many Requests",
+                                         retry_after=self.retry_after)
+            self.bans.append((method.user_id, (method.until_date - self.clock.now).total_seconds()))
+            return True
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+async def _seed() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await upgrade(conn)
+        await conn.execute(insert(User), [
+            {"telegram_id": 500 + i, "pseudo": f"u{i}", "is_member": True,
+             "paid_until": datetime.utcnow() - timedelta(days=10)}
+            for i in range(3)
+        ])
+
+
+def test_kick_after_long_retry_after_stays_temporary(monkeypatch):
+    clock = Clock()
+    session = Session(clock, retry_after=45)
+    monkeypatch.setattr(app, "datetime", clock.datetime_cls())
+    monkeypatch.setattr(broadcast, "GLOBAL_BUCKET", Bucket(clock))
+    monkeypatch.setattr(app.bot, "session", session)
+
+    async def scenario():
+        await _seed()
+        stats = await app.jobs.run("expire")
+        return stats, await kick_backlog()
+
+    stats, backlog = asyncio.run(scenario())
+
+    assert stats.failed == 0 and backlog == {}
+    assert sorted(u for u, _ in session.bans) == [500, 501, 502]
+    # Telegram : moins de 30 s (ou plus de 366 j) = ban définitif
+    for user, remaining in session.bans:
+        assert remaining > 30, (user, remaining)
@@ -0,0 +1,43 @@
+# tests/test_fsm_storage.py
+"""SQLiteStorage : écritures flushées à l'arrêt du dispatcher, états expirés jamais resservis."""
+import asyncio
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+
+from database.database import Base, engine
+from database.fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+async def _create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def test_dispatcher_shutdown_flushes_pending_writes():
+    async def scenario():
+        await _create_tables()
+        storage = SQLiteStorage(flush_interval=3600)      # seul l'arrêt peut flusher
+        dp = Dispatcher(storage=storage)
+        dp.shutdown.register(dp.storage.close)            # comme bot.py (double appel sans effet)
+        await storage.set_state(KEY, "Onboarding:quit_date")
+        await storage.set_data(KEY, {"step": 2})
+        await dp.emit_shutdown()
+        fresh = SQLiteStorage()
+        return await fresh.get_state(KEY), await fresh.get_data(KEY)
+
+    assert asyncio.run(scenario()) == ("Onboarding:quit_date", {"step": 2})
+
+
+def test_expired_entry_is_not_served_from_cache():
+    async def scenario():
+        await _create_tables()
+        storage = SQLiteStorage(ttl=60)
+        await storage.set_state(KEY, "Reply:text")
+        await storage.close()
+        storage._cache[storage.key_builder.build(KEY)].touched -= 120
+        return await storage.get_state(KEY)
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,40 @@
+# tests/test_jobs.py
+"""Lancement manuel d'un job à l'heure locale : tous les fuseaux, pas seulement ceux de l'heure courante."""
+import asyncio
+from datetime import datetime
+
+from database.database import Base, engine
+from database.user import UTC_OFFSETS
+from services.jobs import JobScheduler, local_day_slots, local_hour_slots
+
+
+def test_local_day_slots_cover_every_offset_with_its_local_date():
+    slots = local_day_slots(datetime(2026, 10, 18, 22, 0))
+    assert len(slots) == len(UTC_OFFSETS)
+    assert "UTC-12 2026-10-18" in slots and "UTC+2 2026-10-19" in slots
+
+
+def test_trigger_runs_every_given_scope():
+    scheduler = JobScheduler()
+    seen: list[str] = []
+
+    @scheduler.job("test_local_day", "0 * * * *", scopes=lambda now: local_hour_slots(9, now))
+    async def job(run):
+        seen.append(run.scope)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        finished = []
+
+        async def on_finish(run, error):
+            finished.append(error)
+
+        scopes = local_day_slots()
+        await scheduler.trigger("test_local_day", on_finish=on_finish, scopes=scopes)
+        while len(finished) < len(scopes):
+            await asyncio.sleep(0.01)
+        return scopes, finished
+
+    scopes, finished = asyncio.run(scenario())
+    assert seen == scopes and finished == [None] * len(scopes)
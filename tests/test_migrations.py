@@ -0,0 +1,104 @@
+# tests/test_migrations.py
+"""Une base créée avec le schéma d'origine (avant toute migration) monte jusqu'à la dernière version."""
+import asyncio, sqlite3
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.database import Base
+from database.migrations import MIGRATIONS, upgrade
+
+# schéma du premier commit (create_all des modèles d'alors)
+BASELINE = """
+CREATE TABLE users (
+    id INTEGER NOT NULL,
+    telegram_id BIGINT NOT NULL,
+    pseudo VARCHAR(30),
+    avatar_emoji VARCHAR(4),
+    quit_date DATE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    is_member BOOLEAN NOT NULL,
+    notifications_enabled BOOLEAN NOT NULL,
+    last_checkpoint INTEGER NOT NULL,
+    is_sober BOOLEAN NOT NULL,
+    paid_until DATETIME,
+    lifetime_access BOOLEAN NOT NULL,
+    free90_claimed BOOLEAN NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (telegram_id)
+);
+CREATE TABLE posts (
+    id INTEGER NOT NULL,
+    author_id INTEGER,
+    thread_id INTEGER NOT NULL,
+    parent_id INTEGER,
+    text TEXT,
+    reply_count INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    deleted BOOLEAN,
+    PRIMARY KEY (id),
+    FOREIGN KEY(author_id) REFERENCES users (id),
+    FOREIGN KEY(parent_id) REFERENCES posts (id)
+);
+CREATE TABLE post_likes (
+    id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (post_id, user_id),
+    FOREIGN KEY(post_id) REFERENCES posts (id)
+);
+INSERT INTO users (telegram_id, pseudo, avatar_emoji, quit_date, is_member, notifications_enabled,
+                   last_checkpoint, is_sober, paid_until, lifetime_access, free90_claimed)
+VALUES (111, 'old', '👤', '2024-01-01', 1, 1, 7, 1, '2030-01-01 00:00:00', 0, 1);
+INSERT INTO posts (id, author_id, thread_id, text, reply_count, deleted) VALUES (5, 1, 2, 'hi', 0, 0);
+INSERT INTO post_likes (post_id, user_id) VALUES (5, 1);
+"""
+
+
+def _schema(path) -> tuple[dict[str, set[str]], set[str]]:
+    with sqlite3.connect(path) as db:
+        tables = [r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        columns = {t: {r[1] for r in db.execute(f"PRAGMA table_info({t})")} for t in tables}
+        indexes = {r[0] for r in db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+    return columns, indexes
+
+
+async def _init(path) -> int:
+    """Même séquence que init_db() : create_all puis migrations."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            return await upgrade(conn)
+    finally:
+        await engine.dispose()
+
+
+def test_baseline_upgrades_to_head(tmp_path):
+    old, fresh = tmp_path / "old.db", tmp_path / "fresh.db"
+    with sqlite3.connect(old) as db:
+        db.executescript(BASELINE)
+
+    assert asyncio.run(_init(old)) == MIGRATIONS[-1][0]
+    assert asyncio.run(_init(fresh)) == MIGRATIONS[-1][0]
+
+    # la base migrée a le même schéma qu'une base neuve
+    old_columns, old_indexes = _schema(old)
+    fresh_columns, fresh_indexes = _schema(fresh)
+    assert old_indexes == fresh_indexes
+    for table, columns in fresh_columns.items():
+        assert old_columns[table] == columns, table
+
+    with sqlite3.connect(old) as db:
+        assert db.execute("SELECT next_milestone_at, utc_offset FROM users").fetchone()[0] == "2024-01-31"
+        assert db.execute("SELECT likes_count FROM posts").fetchone() == (1,)
+        assert db.execute("SELECT value FROM app_counters WHERE name = 'free90_used'").fetchone() == (1,)
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    db = tmp_path / "again.db"
+    with sqlite3.connect(db) as conn:
+        conn.executescript(BASELINE)
+    version = asyncio.run(_init(db))
+    assert asyncio.run(_init(db)) == version
@@ -0,0 +1,122 @@
+# tests/test_workers.py
+"""Routage des updates vers les workers (services/workers.py)."""
+import asyncio, queue
+
+from aiogram.types import Update
+
+from database.utils import apply_invalidations, set_invalidation_hook, user_cache
+from services import metrics
+from services.workers import order_key, route_key, serve
+
+GROUP = -1001234567890
+
+
+def _callback(update_id: int, user_id: int, data: str, chat_id: int = GROUP, message_id: int = 42) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "ci", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "message": {
+                "message_id": message_id, "date": 0,
+                "chat": {"id": chat_id, "type": "supergroup"},
+                "from": {"id": 1, "is_bot": True, "first_name": "bot"},
+                "text": "post",
+            },
+        },
+    })
+
+
+def _message(update_id: int, user_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": "hi",
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+        },
+    })
+
+
+def test_likes_on_one_post_share_a_worker():
+    keys = {route_key(_callback(i, 1000 + i, "like:42")) for i in range(50)}
+    assert len(keys) == 1
+    assert route_key(_callback(99, 1000, "like:43", message_id=43)) not in keys
+    assert order_key(_callback(1, 1000, "like:42")) is None     # même worker, mais pas en file
+
+
+def test_other_callbacks_and_messages_follow_the_user():
+    # reply: pose un état FSM dans le scope DM de l'user : même worker que ses messages
+    assert route_key(_callback(1, 777, "reply:42")) == route_key(_message(2, 777)) == 777
+
+
+def test_remote_invalidations_are_applied_but_not_relayed():
+    relayed = []
+    set_invalidation_hook(lambda name, key: relayed.append((name, key)))
+    try:
+        user_cache.set(777, "u")
+        apply_invalidations([("user", 777)])
+        assert user_cache.get(777) is None and relayed == []
+        user_cache.invalidate(778)
+        assert relayed == [("user", 778)]
+    finally:
+        set_invalidation_hook(None)
+
+
+def test_worker_snapshots_add_up_at_the_ingress():
+    total = metrics.Counter("test_worker_total", "test", ["kind"])
+    hist = metrics.Histogram("test_worker_seconds", "test", buckets=(0.1, 1.0))
+    total.labels("a").inc(2)
+    hist.observe(0.05)
+    snap = metrics.snapshot()
+    metrics.REMOTE.update({0: snap, 1: snap})
+    try:
+        assert dict((k, c.value) for k, c in total.items()) == {("a",): 6}
+        [(_, child)] = hist.items()
+        assert child.count == 3 and child.buckets[0] == 3
+        assert 'test_worker_total{kind="a"} 6' in metrics.render()
+    finally:
+        metrics.REMOTE.clear()
+
+
+class _Blocking:
+    """dp / bot factices : les updates de `hot` restent bloqués tant que `release` n'est pas posé."""
+
+    def __init__(self, hot: int):
+        self.hot = hot
+        self.release = asyncio.Event()
+        self.done: list[int] = []
+        self.storage = self.session = self
+
+    async def feed_update(self, bot, update: Update) -> None:
+        if update.event.from_user.id == self.hot:
+            await self.release.wait()
+        self.done.append(update.update_id)
+
+    async def close(self) -> None:
+        pass
+
+
+def test_hot_key_and_viral_post_do_not_starve_other_users():
+    async def scenario():
+        fake = _Blocking(hot=1)
+        q, reports = queue.Queue(), queue.Queue()
+        items = [_message(i, 1) for i in range(1, 6)]                        # rafale d'un user
+        items += [_callback(100 + i, 10 + i, "like:42") for i in range(3)]  # post viral
+        items += [_message(200, 2)]                                          # un autre user
+        for u in items:
+            q.put(("update", order_key(u), u.model_dump_json(by_alias=True, exclude_none=True)))
+        worker = asyncio.create_task(serve(fake, fake, 0, q, reports, concurrency=2))
+        for _ in range(200):
+            if {100, 101, 102, 200} <= set(fake.done):
+                break
+            await asyncio.sleep(0.01)
+        served_while_blocked = set(fake.done)
+        fake.release.set()
+        q.put(None)
+        await asyncio.wait_for(worker, 5)
+        return served_while_blocked, fake.done
+
+    served_while_blocked, done = asyncio.run(scenario())
+    assert served_while_blocked == {100, 101, 102, 200}
+    assert [i for i in done if i < 100] == [1, 2, 3, 4, 5]